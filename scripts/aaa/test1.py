@@ -1,127 +1,342 @@
 import os
+import sys
 import requests
 from bs4 import BeautifulSoup
-import re
 import random
-from concurrent.futures import ThreadPoolExecutor
-
-# 删除指定文件夹中的所有 .m3u 文件
-def delete_old_m3u_files(folder_path):
-    if not os.path.exists(folder_path):
-        print(f"文件夹 {folder_path} 不存在.")
-        return
-    
-    for file_name in os.listdir(folder_path):
-        if file_name.endswith('.m3u'):
-            file_path = os.path.join(folder_path, file_name)
-            os.remove(file_path)
-            print(f"已删除旧文件: {file_path}")
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
-# 获取子页面链接
-def get_subpage_links(main_url):
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3',
-        'Cache-Control': 'no-store, no-cache, must-revalidate, post-check=0, pre-check=0',
-        'Pragma': 'no-cache',
-        'Expires': '0'
-    }
-    
-    try:
-        url_with_random_query = f"{main_url}?t={random.randint(1, 100000)}"
-        response = requests.get(url_with_random_query, headers=headers)
-        response.raise_for_status()
-    except requests.RequestException as e:
-        print(f"请求失败: {e}")
-        return []
-    
-    soup = BeautifulSoup(response.text, 'html.parser')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.http_cache import ResponseCache
+from common.extract import extract_listing_entries
+from common.frontier import FRONTIER_PATH, STOP_AFTER_PAGES, MAX_PAGES, CrawlFrontier
+from common.crawl_engine import (LISTING_HEADERS, DETAIL_HEADERS, PER_HOST_LIMIT, CONNECT_TIMEOUT, REQUEST_TIMEOUT,
+                                 Category, CrawlEngine, PlaylistLayout, parse_playlist)
+from common.http_client import PooledSession, get
+from common import perf
+
+# 详情页响应缓存目录
+CACHE_DIR = '.cache/huyazy'
+
+# 站点地址
+SITE_URL = "https://huyazy.com"
+
+# 本脚本抓取的分类（电视剧）和输出目录
+TYPE_ID = 20
+FOLDER_PATH = 'scripts/aaa'
+
+# pipeline 模式：解析进程数，以及各阶段之间队列的长度上限（队列满时上游暂停，内存占用保持平稳）
+PARSE_WORKERS = os.cpu_count() or 2
+PIPELINE_QUEUE_SIZE = 64
+
+# pipeline 模式各阶段之间传递的结束标记
+DONE = None
+
+# 分类列表页地址
+def listing_url(type_id, page):
+    return f"{SITE_URL}/index.php/vod/type/id/{type_id}/page/{page}.html?ac=detail"
+
+# 从列表页 HTML 中解析子页面链接
+def parse_subpage_links(html):
+    soup = BeautifulSoup(html, 'html.parser')
     links = soup.find_all('a', href=True)
 
     subpage_urls = []
     for link in links:
         href = link.get('href')
         if href and href.startswith('/index.php/vod/detail/id/'):
-            full_url = f"https://huyazy.com{href}"
+            full_url = f"{SITE_URL}{href}"
             subpage_urls.append(full_url)
-    
+
     return subpage_urls
 
-# 从子页面提取 M3U8 链接及其他信息
-def extract_m3u8_links(url):
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3',
-        'Cache-Control': 'no-store, no-cache, must-revalidate, post-check=0, pre-check=0',
-        'Pragma': 'no-cache',
-        'Expires': '0'
-    }
-    
+# 从详情页 HTML 中解析文件名和 M3U8 链接
+def parse_m3u8_links(html, site_url=None):
+    return parse_playlist(html, site_url or SITE_URL)
+
+# 获取子页面链接
+def get_subpage_links(main_url, session=requests):
     try:
-        url_with_random_query = f"{url}?t={random.randint(1, 100000)}"
-        response = requests.get(url_with_random_query, headers=headers)
+        url_with_random_query = f"{main_url}?t={random.randint(1, 100000)}"
+        with perf.stage('listing'):
+            response = get(session, url_with_random_query, headers=LISTING_HEADERS,
+                           timeout=(CONNECT_TIMEOUT, REQUEST_TIMEOUT))
         response.raise_for_status()
     except requests.RequestException as e:
         print(f"请求失败: {e}")
-        return "default_title.m3u", []
-    
-    soup = BeautifulSoup(response.content, 'html.parser')
-    info_div = soup.find('div', class_='vodInfo')
-    
-    if info_div:
-        title_tag = info_div.find('h2')
-        title = title_tag.get_text(strip=True) if title_tag else "default_title"
-        safe_title = re.sub(r'[<>:"/\\|?*]', '', title)
-        filename = f"{safe_title}.m3u"
-    else:
-        filename = "default_title.m3u"
+        return []
 
-    m3u8_links = []
-    for a_tag in soup.select('#play_2 a'):
-        href = a_tag.get('href')
-        if href and href.endswith('.m3u8'):
-            full_link = href if href.startswith('http') else f"https://huyazy.com{href}"
-            episode_title = a_tag.get_text(strip=True)
-            m3u8_links.append((episode_title, full_link))
+    return parse_subpage_links(response.text)
 
+# 把缓存中的解析结果还原为 (文件名, 链接列表)
+def cached_parse(cache, entry):
+    if entry.get('parsed'):
+        filename, m3u8_links = entry['parsed']
+        return filename, [tuple(link) for link in m3u8_links]
+    body = cache.load_body(entry)
+    if body is None:
+        return None
+    return parse_m3u8_links(body)
+
+# 解析详情页并写入缓存
+def parse_and_store(cache, url, content, etag, last_modified):
+    with perf.stage('parse'):
+        filename, m3u8_links = parse_m3u8_links(content)
+    if cache is not None:
+        cache.store(url, content, etag, last_modified, [filename, m3u8_links])
     return filename, m3u8_links
 
-# 保存 M3U8 链接到文件
-def save_m3u8_links_to_file(folder_path, filename, m3u8_links):
-    if not os.path.exists(folder_path):
-        os.makedirs(folder_path)
-    
-    file_path = os.path.join(folder_path, filename)
-    with open(file_path, 'w') as file:
-        file.write("#EXTM3U\n")
-        for episode_title, link in m3u8_links:
-            cleaned_title = episode_title.split('$')[0]
-            file.write(f"#EXTINF:-1,{cleaned_title}\n")
-            file.write(f"{link}\n")
-    
-    print(f"M3U8 链接已成功写入 {file_path} 文件中")
+# 从子页面提取 M3U8 链接及其他信息（支持条件请求缓存）
+def extract_m3u8_links(url, session=requests, cache=None):
+    entry = cache.get(url) if cache is not None else None
+    headers = dict(DETAIL_HEADERS)
+    if cache is not None:
+        headers.update(cache.conditional_headers(entry))
+
+    try:
+        with perf.stage('detail'):
+            response = get(session, url, headers=headers,
+                           timeout=(CONNECT_TIMEOUT, REQUEST_TIMEOUT))
+            if response.status_code == 304 and entry:
+                cache.revalidated(url)
+                parsed = cached_parse(cache, entry)
+                if parsed is not None:
+                    cache.record(True)
+                    return parsed
+                response = get(session, url, headers=DETAIL_HEADERS,
+                               timeout=(CONNECT_TIMEOUT, REQUEST_TIMEOUT))
+            response.raise_for_status()
+    except requests.RequestException as e:
+        print(f"请求失败: {e}")
+        if cache is not None:
+            cache.record(False)
+        return "default_title.m3u", []
+
+    if cache is not None:
+        cache.record(False)
+    return parse_and_store(cache, url, response.content,
+                           response.headers.get('ETag'), response.headers.get('Last-Modified'))
 
 # 处理子页面，提取和保存 M3U8 链接
-def process_subpage(url, folder_path):
-    filename, m3u8_links = extract_m3u8_links(url)
+def process_subpage(url, layout, session=requests, cache=None):
+    filename, m3u8_links = extract_m3u8_links(url, session, cache)
     if m3u8_links:
-        save_m3u8_links_to_file(folder_path, filename, m3u8_links)
+        layout.write(url, (filename, m3u8_links))
     else:
         print(f"No M3U8 links found for {url}")
 
-# 主函数
-def main():
-    folder_path = 'scripts/aaa'
-    delete_old_m3u_files(folder_path)
-    
-    base_urls = [
-        "https://huyazy.com/index.php/vod/type/id/20/page/1.html?ac=detail",
-        "https://huyazy.com/index.php/vod/type/id/20/page/2.html?ac=detail"
-    ]
-    
-    with ThreadPoolExecutor() as executor:
+# 线程池模式：先取列表页，再把详情页交给线程池（旧的同步实现，不检查剧集链接）
+# 返回 (列表页中的全部详情页地址, 列表页是否全部抓取成功)
+def crawl_with_threads(base_urls, layout, cache=None):
+    listed_urls = set()
+    complete = True
+    with PooledSession(timeout=(CONNECT_TIMEOUT, REQUEST_TIMEOUT)) as session, ThreadPoolExecutor() as executor:
         for main_url in base_urls:
-            subpage_urls = get_subpage_links(main_url)
+            subpage_urls = get_subpage_links(main_url, session)
+            if not subpage_urls:
+                complete = False
             for url in subpage_urls:
-                executor.submit(process_subpage, url, folder_path)
+                if url in listed_urls:
+                    continue
+                listed_urls.add(url)
+                executor.submit(process_subpage, url, layout, session, cache)
+        executor.shutdown(wait=True)
+        print(session.summary())
+        perf.section('http', session.stats.as_dict())
+    return listed_urls, complete
+
+# 流水线的一个阶段：workers 个协程从 inbox 取任务交给 handle，结果放入 outbox
+# 收到结束标记时放回去让同阶段的其他协程也退出，全部退出后向下游发送一个结束标记
+async def pipeline_stage(name, inbox, outbox, workers, handle, peaks):
+    async def worker():
+        while True:
+            item = await inbox.get()
+            if item is DONE:
+                inbox.put_nowait(DONE)
+                return
+            result = await handle(item)
+            if result is not None and outbox is not None:
+                await outbox.put(result)
+                peaks[name] = max(peaks.get(name, 0), outbox.qsize())
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    if outbox is not None:
+        await outbox.put(DONE)
+
+
+class PipelineEngine(CrawlEngine):
+    """流水线模式：事件循环负责网络请求，解析交给进程池，单个写入协程负责输出
+
+    列表页 -> 地址队列 -> 抓取协程 -> 正文队列 -> 解析进程 -> (检查剧集链接) -> 写入队列 -> 写入协程
+    各队列有长度上限，下游处理不过来时上游自动暂停。请求、缓存和解析都沿用 CrawlEngine，
+    只替换按页数抓取的调度方式；分类的布局需要提供 check() 和 write()（PlaylistLayout）。
+    """
+
+    def __init__(self, categories, parse_workers=PARSE_WORKERS, queue_size=PIPELINE_QUEUE_SIZE, **kwargs):
+        super().__init__(categories, **kwargs)
+        self.parse_workers = parse_workers
+        self.queue_size = queue_size
+        self.peaks = {}
+
+    async def run(self):
+        with ProcessPoolExecutor(max_workers=self.parse_workers) as pool:
+            self.parse_pool = pool
+            try:
+                summary = await super().run()
+            finally:
+                self.parse_pool = None
+        perf.section('pipeline', {f"{name}_queue_peak": peak for name, peak in self.peaks.items()})
+        return summary
+
+    async def crawl_pages(self, category):
+        layout = category.layout
+        listed = set()
+        url_queue = asyncio.Queue()
+        body_queue = asyncio.Queue(self.queue_size)
+        parsed_queue = asyncio.Queue(self.queue_size)
+        validate = self.validator is not None and layout.validate
+        write_queue = asyncio.Queue(self.queue_size) if validate else parsed_queue
+
+        async def crawl_listing(page):
+            content = await self.fetch_listing(self.listing_url(category.type_id, page))
+            if content is None:
+                return False
+            for url, _ in extract_listing_entries(content, self.site_url):
+                if url not in listed:
+                    listed.add(url)
+                    await url_queue.put(url)
+            return True
+
+        async def list_all():
+            results = await asyncio.gather(*(crawl_listing(page) for page in range(1, category.pages + 1)))
+            await url_queue.put(DONE)
+            return all(results)
+
+        async def fetch(url):
+            body = await self.detail(url)
+            return None if body is None else (url, body)
+
+        async def parse(item):
+            url, body = item
+            parsed = await self.parse(category, body)
+            if not parsed[-1]:
+                print(f"No M3U8 links found for {url}")
+                return None
+            return url, parsed
+
+        async def check(item):
+            url, parsed = item
+            parsed = await layout.check(self, url, parsed)
+            return None if parsed is None else (url, parsed)
+
+        async def write(item):
+            layout.write(*item)
+
+        stages = [
+            list_all(),
+            pipeline_stage('body', url_queue, body_queue, self.per_host, fetch, self.peaks),
+            # 每个解析进程配一个分派协程，多一个用来在进程忙时预先取出下一个任务
+            pipeline_stage('parsed', body_queue, parsed_queue, self.parse_workers + 1, parse, self.peaks),
+            pipeline_stage('write', write_queue, None, 1, write, self.peaks),
+        ]
+        if validate:
+            stages.append(pipeline_stage('validated', parsed_queue, write_queue, self.per_host * 4,
+                                         check, self.peaks))
+        results = await asyncio.gather(*stages)
+        return listed, results[0]
+
+# 命令行参数
+def parse_args():
+    parser = argparse.ArgumentParser(description="抓取 huyazy 分类下的 M3U8 链接")
+    parser.add_argument('--mode', choices=['async', 'threads', 'catalog', 'pipeline'], default='async',
+                        help="抓取模式：async 为异步连接池，threads 为旧的线程池模式，"
+                             "catalog 为按进度库翻完整个分类的增量抓取，"
+                             "pipeline 为异步抓取、多进程解析、单线程写入的流水线")
+    parser.add_argument('--per-host', type=int, default=PER_HOST_LIMIT,
+                        help="每个主机的最大并发连接数")
+    parser.add_argument('--connect-timeout', type=float, default=CONNECT_TIMEOUT,
+                        help="建立连接的超时时间（秒）")
+    parser.add_argument('--timeout', type=float, default=REQUEST_TIMEOUT,
+                        help="单次请求的总超时时间（秒）")
+    parser.add_argument('--cache-dir', default=CACHE_DIR,
+                        help="详情页响应缓存目录")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="禁用详情页条件请求缓存")
+    parser.add_argument('--cache-max-age', type=float, default=7,
+                        help="缓存最长保留天数")
+    parser.add_argument('--cache-max-mb', type=float, default=200,
+                        help="缓存总大小上限（MB）")
+    parser.add_argument('--no-validate', action='store_true',
+                        help="不检查剧集链接的可用性和镜像速度（threads 模式不检查）")
+    parser.add_argument('--parse-workers', type=int, default=PARSE_WORKERS,
+                        help="pipeline 模式的解析进程数")
+    parser.add_argument('--queue-size', type=int, default=PIPELINE_QUEUE_SIZE,
+                        help="pipeline 模式各阶段之间队列的长度上限")
+    parser.add_argument('--type-id', type=int, default=TYPE_ID,
+                        help="抓取的分类编号")
+    parser.add_argument('--frontier', default=FRONTIER_PATH,
+                        help="catalog 模式的进度库（SQLite）路径")
+    parser.add_argument('--full', action='store_true',
+                        help="catalog 模式强制翻完所有列表页，并清理已下架的节目")
+    parser.add_argument('--stop-after', type=int, default=STOP_AFTER_PAGES,
+                        help="catalog 模式下连续多少页没有变化时停止翻页")
+    parser.add_argument('--max-pages', type=int, default=MAX_PAGES,
+                        help="catalog 模式单次运行最多翻的页数，没翻完的下次继续")
+    return parser.parse_args()
+
+# 主函数
+def main():
+    args = parse_args()
+    perf.start('huyazy_series')
+    layout = PlaylistLayout(FOLDER_PATH, validate=not args.no_validate)
+
+    cache = None
+    if not args.no_cache:
+        cache = ResponseCache(args.cache_dir, max_age=args.cache_max_age * 86400,
+                              max_bytes=int(args.cache_max_mb * 1024 * 1024))
+
+    if args.mode == 'threads':
+        layout.open()
+        base_urls = [listing_url(args.type_id, 1), listing_url(args.type_id, 2)]
+        listed_urls, complete = crawl_with_threads(base_urls, layout, cache)
+        counts = dict(layout.finish(listed_urls, complete), complete=complete)
+    else:
+        # 其他模式都由共用的抓取引擎完成，本脚本只配置电视剧一个分类
+        category = Category('电视剧', args.type_id, layout, catalog=args.mode == 'catalog', full=args.full,
+                            stop_after=args.stop_after, max_pages=args.max_pages)
+        frontier = CrawlFrontier(args.frontier) if args.mode == 'catalog' else None
+        options = dict(site_url=SITE_URL, per_host=args.per_host, connect_timeout=args.connect_timeout,
+                       request_timeout=args.timeout, cache=cache, frontier=frontier)
+        if args.mode == 'pipeline':
+            engine = PipelineEngine([category], args.parse_workers, args.queue_size, **options)
+        else:
+            engine = CrawlEngine([category], **options)
+        try:
+            counts = asyncio.run(engine.run())[category.name]
+        finally:
+            if frontier is not None:
+                frontier.close()
+        print(engine.stats.summary())
+
+    if not counts['complete']:
+        if args.mode == 'catalog':
+            print("本次没有完整翻完所有列表页，不删除任何旧文件")
+        else:
+            print("部分列表页抓取失败，本次不删除任何旧文件")
+    print(f"更新 {counts['updated']} 个，未变化 {counts['unchanged']} 个，删除 {counts['removed']} 个播放列表")
+    perf.count('playlists_updated', counts['updated'])
+    perf.count('playlists_unchanged', counts['unchanged'])
+    perf.count('playlists_removed', counts['removed'])
+
+    if cache is not None:
+        evicted = cache.evict()
+        cache.save()
+        print(f"缓存命中 {cache.hits} 次，未命中 {cache.misses} 次，淘汰过期记录 {evicted} 条")
+        perf.count('cache_hits', cache.hits)
+        perf.count('cache_misses', cache.misses)
+
+    perf.finish()
 
 if __name__ == "__main__":
     main()
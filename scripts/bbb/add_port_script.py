@@ -1,5 +1,17 @@
+import os
+import sys
+import json
+import argparse
+import ipaddress
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.http_client import PooledSession, get
+from common import perf
+
 # 源文件的 GitHub 原始地址列表
 source_urls = [
     "https://raw.githubusercontent.com/ymyuuu/IPDB/main/bestproxy.txt",
@@ -10,30 +22,143 @@ source_urls = [
 # 目标文件路径
 destination_file = "scripts/bbb/port.txt"
 
+# 保存各个源的 ETag / Last-Modified 和上一次内容，用于条件请求
+state_file = ".cache/ipdb_sources.json"
+
+# 单次请求超时（秒）
+REQUEST_TIMEOUT = (10, 30)
+
 def format_ip_with_port(ip_list):
     """为每个 IP 地址添加格式 '<IP地址>:443 #优选443'"""
-    return [f"{ip}:443#优选443" for ip in ip_list]
+    return [f"[{ip}]:443#优选443" if ip.version == 6 else f"{ip}:443#优选443" for ip in ip_list]
+
+def load_state(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_state(path, state):
+    folder = os.path.dirname(path) or "."
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+def fetch_source(session, url, cached):
+    """条件请求下载一个源，返回 (内容, 是否有变化)；失败时退回上一次的内容"""
+    headers = {}
+    if cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    if cached.get("last_modified"):
+        headers["If-Modified-Since"] = cached["last_modified"]
+
+    try:
+        response = get(session, url, headers=headers, timeout=REQUEST_TIMEOUT)
+        if response.status_code == 304 and "body" in cached:
+            return cached["body"], False
+        response.raise_for_status()
+    except requests.RequestException as e:
+        print(f"Failed to download the file from {url}: {e}")
+        return cached.get("body"), False
+
+    cached.update({
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "body": response.text,
+    })
+    return response.text, True
+
+def parse_address(line):
+    """从一行中解析出公网 IP，支持 'IP'、'IP:端口' 和 '[IPv6]:端口'，无效行返回 None"""
+    token = line.split("#")[0].strip()
+    if token.startswith("["):
+        token = token[1:].partition("]")[0]
+    elif token.count(":") == 1:
+        token = token.split(":")[0]
+    try:
+        ip = ipaddress.ip_address(token)
+    except ValueError:
+        return None
+    if (ip.is_private or ip.is_loopback or ip.is_unspecified or ip.is_multicast
+            or ip.is_reserved or ip.is_link_local):
+        return None
+    return ip
+
+def merge_addresses(bodies):
+    """合并多个源的内容，按整数值去重，返回排好序的 IP 列表和无效行数"""
+    seen = {4: set(), 6: set()}
+    invalid = 0
+    for body in bodies:
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            ip = parse_address(line)
+            if ip is None:
+                invalid += 1
+                continue
+            seen[ip.version].add(int(ip))
+    ips = [ipaddress.IPv4Address(n) for n in sorted(seen[4])]
+    ips += [ipaddress.IPv6Address(n) for n in sorted(seen[6])]
+    return ips, invalid
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="合并 IPDB 源并生成 port.txt")
+    parser.add_argument("--force", action="store_true", help="即使源没有变化也重新生成")
+    parser.add_argument("--cidr-output", default=None,
+                        help="额外把合并结果折叠为 CIDR 网段写入该文件")
+    return parser.parse_args()
 
 def main():
-    combined_ip_list = []
+    args = parse_args()
+    perf.start('ipdb_merge')
+    state = load_state(state_file)
 
-    # 下载每个源文件内容并合并
-    for url in source_urls:
-        response = requests.get(url)
-        if response.status_code == 200:
-            ip_list = response.text.splitlines()
-            combined_ip_list.extend(ip_list)  # 将所有 IP 地址合并到一起
-        else:
-            print(f"Failed to download the file from {url}")
+    # 并发下载每个源文件，同一个会话复用连接
+    with PooledSession(pool_size=len(source_urls)) as session, \
+            ThreadPoolExecutor(max_workers=len(source_urls)) as executor, perf.stage('fetch'):
+        results = list(executor.map(lambda url: fetch_source(session, url, state.setdefault(url, {})),
+                                    source_urls))
+        print(session.summary())
+        perf.section('http', session.stats.as_dict())
 
-    # 为每个 IP 地址添加格式化内容
-    updated_ip_list = format_ip_with_port(combined_ip_list)
+    bodies = [body for body, _ in results if body is not None]
+    changed = any(changed for _, changed in results)
+    save_state(state_file, state)
+
+    if not bodies:
+        print("No source could be downloaded, keeping the existing file.")
+        perf.finish()
+        return
+    if not changed and not args.force and os.path.exists(destination_file):
+        print("Sources not modified, skipping rebuild.")
+        perf.count('skipped_unchanged')
+        perf.finish()
+        return
+
+    # 去重、校验后为每个 IP 地址添加格式化内容
+    with perf.stage('merge'):
+        ips, invalid = merge_addresses(bodies)
+        updated_ip_list = format_ip_with_port(ips)
+    perf.count('addresses', len(ips))
+    perf.count('invalid_lines', invalid)
 
     # 保存到目标文件
-    with open(destination_file, "w") as f:
+    with perf.stage('write'), open(destination_file, "w") as f:
         f.write("\n".join(updated_ip_list))
 
-    print(f"Updated IP list with port 443 saved to {destination_file}")
+    if args.cidr_output:
+        networks = list(ipaddress.collapse_addresses(ip for ip in ips if ip.version == 4))
+        networks += list(ipaddress.collapse_addresses(ip for ip in ips if ip.version == 6))
+        with open(args.cidr_output, "w") as f:
+            f.write("\n".join(str(network) for network in networks))
+        print(f"{len(networks)} CIDR ranges saved to {args.cidr_output}")
+
+    print(f"Updated IP list with port 443 saved to {destination_file} "
+          f"({len(ips)} unique addresses, {invalid} invalid lines dropped)")
+    perf.finish()
 
 if __name__ == "__main__":
     main()
@@ -1,31 +1,47 @@
-import requests
+import os
+import sys
 from bs4 import BeautifulSoup
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.http_client import PooledSession, get
+from common import perf
+
 # 网页 URL
 url = "https://cf.090227.xyz/"
 
-# 获取网页内容
-response = requests.get(url)
-response.raise_for_status()  # 如果请求失败，抛出异常
+# 抓取表格中的 IP 并写入 port_data.txt
+def main():
+    perf.start('cf_table')
+
+    # 获取网页内容（带超时，连接错误和 429/5xx 时退避重试）
+    with PooledSession() as session, perf.stage('fetch'):
+        response = get(session, url)
+    response.raise_for_status()  # 如果请求失败，抛出异常
+
+    with perf.stage('parse'):
+        # 解析网页
+        soup = BeautifulSoup(response.text, 'html.parser')
 
-# 解析网页
-soup = BeautifulSoup(response.text, 'html.parser')
+        # 找到表格
+        table = soup.find('table')
 
-# 找到表格
-table = soup.find('table')
+        # 找到所有表格行
+        rows = table.find_all('tr')
 
-# 找到所有表格行
-rows = table.find_all('tr')
+    # 打开文件并写入数据
+    with open('scripts/bbb/port_data.txt', mode='w', encoding='utf-8') as file:
+        # 遍历表格行并提取 IP 数据
+        for row in rows[1:]:  # 跳过表头
+            columns = row.find_all('td')
+            if len(columns) == 5:  # 确保该行有 5 列
+                ip = columns[1].text.strip()  # 获取第二列（IP列）
+                # 拼接 ":443#优选443"
+                ip_with_port = f"{ip}:443#优选443"
+                file.write(f"{ip_with_port}\n")  # 将拼接后的 IP 写入文件，每个 IP 占一行
 
-# 打开文件并写入数据
-with open('scripts/bbb/port_data.txt', mode='w', encoding='utf-8') as file:
-    # 遍历表格行并提取 IP 数据
-    for row in rows[1:]:  # 跳过表头
-        columns = row.find_all('td')
-        if len(columns) == 5:  # 确保该行有 5 列
-            ip = columns[1].text.strip()  # 获取第二列（IP列）
-            # 拼接 ":443#优选443"
-            ip_with_port = f"{ip}:443#优选443"
-            file.write(f"{ip_with_port}\n")  # 将拼接后的 IP 写入文件，每个 IP 占一行
+    print("IP data with ':443#优选443' fetched and saved to scripts/bbb/port_data.txt")
+    perf.count('rows', len(rows) - 1)
+    perf.finish(session.stats)
 
-print("IP data with ':443#优选443' fetched and saved to scripts/bbb/port_data.txt")
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,26 @@
-import socket
-import concurrent.futures
+import os
+import re
+import sys
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.tcp_scan import parse_endpoint, scan_latency, DEFAULT_CONCURRENCY, DEFAULT_TIMEOUT
+from common.probe_history import ProbeHistory
+from common.ip_index import RANGES_PATH, IpRangeIndex, prefilter, format_owner_counts
+from common import perf
+
+# 需要探测并按延迟重排的列表文件
+DEFAULT_FILES = ["scripts/bbb/port.txt", "scripts/bbb/ip.txt"]
+
+# 延迟历史记录文件
+HISTORY_FILE = ".cache/probe_history.json"
+
+# 每个文件最多保留的条目数
+TOP_N = 200
+
+# 注释中上一次写入的延迟，例如 "#优选443|23ms"
+LATENCY_SUFFIX_RE = re.compile(r'\|?\d+ms$')
 
 # 从文件读取 IP 地址列表，保留原始行内容以便写回
 def read_ip_list(file_path):
@@ -11,50 +32,116 @@ def read_ip_list(file_path):
                 ip_list.append(line.strip().replace(" ", ""))  # 去掉空格，保留原始行
     return ip_list
 
-# 测试连接每个 IP
-def check_ip(line):
-    # 去掉端口后的注释部分，只保留IP和端口
-    ip_with_comment = line.strip().replace(" ", "")
-    ip = line.split('#')[0].strip()
-    
-    # 分割IP和端口
-    if ":" in ip:
-        host, port = ip.split(":")
-        try:
-            port = int(port)
-        except ValueError:
-            print(f"Invalid port value: {port} in IP {ip}")
-            return None  # 返回 None 如果端口无效
-
-        try:
-            # 尝试连接目标 IP 和端口
-            with socket.create_connection((host, port), timeout=5) as sock:
-                print(f"IP {ip} is accessible.")
-                return ip_with_comment  # 返回包含注释的原始行内容
-        except (socket.timeout, socket.error) as e:
-            print(f"IP {ip} is not accessible. Error: {e}")
-            return None  # 返回 None 如果不可访问
-    else:
-        return None  # 返回 None 如果格式不正确
+# 端点在历史记录中的键
+def endpoint_key(host, port):
+    return f"[{host}]:{port}" if ':' in host else f"{host}:{port}"
+
+# 生成写回文件的行：地址 + 原注释 + 本次测得的延迟
+def format_line(line, latency_ms):
+    address, _, label = line.partition('#')
+    label = LATENCY_SUFFIX_RE.sub('', label)
+    latency = f"{latency_ms:.0f}ms"
+    return f"{address}#{label}|{latency}" if label else f"{address}#{latency}"
+
+# 命令行参数
+def parse_args():
+    parser = argparse.ArgumentParser(description="测量 IP 列表的握手延迟，按历史加权分数排序写回")
+    parser.add_argument('--file', action='append', dest='files',
+                        help="IP 列表文件，可重复指定，默认为 port.txt 和 ip.txt")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help="同时进行中的连接数上限")
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT,
+                        help="单次连接的超时时间（秒）")
+    parser.add_argument('--samples', type=int, default=3,
+                        help="每个端点的采样次数")
+    parser.add_argument('--tls', action='store_true',
+                        help="同时测量 TLS 握手耗时")
+    parser.add_argument('--sni', default=None,
+                        help="TLS 握手使用的 SNI，默认使用 IP 本身")
+    parser.add_argument('--top', type=int, default=TOP_N,
+                        help="每个文件最多保留的条目数，0 表示不限制")
+    parser.add_argument('--history', default=HISTORY_FILE,
+                        help="延迟历史记录文件")
+    parser.add_argument('--owner', action='append', dest='owners',
+                        help="只探测这些归属的地址（例如 cloudflare、oracle、unknown），可重复指定")
+    parser.add_argument('--exclude-owner', action='append', dest='exclude',
+                        help="不探测这些归属的地址，可重复指定")
+    parser.add_argument('--per-network', type=int, default=0,
+                        help="每个网段最多探测的地址数，按历史分数优先，0 表示不限制")
+    parser.add_argument('--ranges', default=RANGES_PATH,
+                        help="离线 IP 段数据文件")
+    return parser.parse_args()
 
 def main():
-    ip_list = read_ip_list("scripts/bbb/port.txt")  # 假设文件路径是这个
-    accessible_ips = []
-
-    # 使用 ThreadPoolExecutor 进行并行连接测试
-    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-        # 使用 map 来并行执行 check_ip 函数
-        results = executor.map(check_ip, ip_list)
-        
-        # 收集所有可访问的 IP
-        accessible_ips = [ip for ip in results if ip is not None]
-
-    # 将可访问的 IP 保存回文件
-    with open("scripts/bbb/port.txt", "w") as file:
-        for ip in accessible_ips:
-            file.write(f"{ip}\n")  # 保留注释紧跟在IP和端口后
-
-    print(f"Total {len(accessible_ips)} accessible IPs.")
+    args = parse_args()
+    perf.start('port_probe')
+    files = args.files or DEFAULT_FILES
+    history = ProbeHistory(args.history)
+
+    # 先解析出主机和端口，格式错误的行直接丢弃；多个文件中重复的端点只测一次
+    file_targets = {}
+    endpoints = {}
+    for file_path in files:
+        if not os.path.exists(file_path):
+            print(f"File not found, skipped: {file_path}")
+            continue
+        targets = []
+        for line in read_ip_list(file_path):
+            endpoint = parse_endpoint(line)
+            if endpoint is None:
+                print(f"Invalid line skipped: {line}")
+                continue
+            targets.append((line, endpoint_key(*endpoint)))
+            endpoints.setdefault(endpoint_key(*endpoint), endpoint)
+        file_targets[file_path] = targets
+
+    # 探测之前按离线 IP 段索引过滤：只留需要的归属，每个网段只探测历史分数最好的若干个
+    keys = list(endpoints)
+    with perf.stage('prefilter'):
+        index = IpRangeIndex.load(args.ranges)
+        ranked = sorted(keys, key=lambda key: (history.score(key) is None, history.score(key) or 0))
+        keys, per_owner = prefilter([(key, endpoints[key][0]) for key in ranked], index,
+                                    args.owners, args.exclude, args.per_network)
+    print(f"探测 {len(keys)} / {len(endpoints)} 个端点（保留/总数: {format_owner_counts(per_owner)}）")
+    perf.count('prefiltered', len(endpoints) - len(keys))
+
+    # 使用 asyncio 并发测量延迟，并更新历史加权平均
+    with perf.stage('probe'):
+        results = asyncio.run(scan_latency([endpoints[key] for key in keys], args.samples,
+                                           args.concurrency, args.timeout, args.tls, args.sni))
+    alive = set()
+    for key, result in zip(keys, results):
+        latency = result['tcp']
+        if latency is not None:
+            alive.add(key)
+            if args.tls and result['tls'] is not None:
+                latency += result['tls']
+        history.update(key, latency, result['loss'])
+    history.save()
+    perf.count('endpoints', len(keys))
+    perf.count('alive', len(alive))
+
+    # 探测过的端点只保留本次可达的，按分数从低到高排序后截取前 N 个；
+    # 被预过滤跳过的端点没有测量结果，原样写在后面，过滤只影响探测范围，不会删掉列表中的条目
+    probed = set(keys)
+    for file_path, targets in file_targets.items():
+        ranked = sorted(((history.score(key), line, key) for line, key in targets if key in alive),
+                        key=lambda item: item[0])
+        if args.top > 0:
+            ranked = ranked[:args.top]
+        skipped = [line for line, key in targets if key not in probed]
+
+        with perf.stage('write'), open(file_path, "w") as file:
+            for _, line, key in ranked:
+                file.write(f"{format_line(line, history.latency(key))}\n")
+            for line in skipped:
+                file.write(f"{line}\n")
+
+        print(f"{file_path}: kept {len(ranked)} of {len(targets)} entries, "
+              f"{sum(1 for _, key in targets if key in alive)} accessible, "
+              f"{len(skipped)} not probed and kept as is.")
+
+    perf.finish()
 
 if __name__ == "__main__":
     main()
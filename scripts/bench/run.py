@@ -0,0 +1,196 @@
+import io
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(BENCH_DIR, '..')
+sys.path.insert(0, SCRIPTS_DIR)
+for folder in ('aaa', 'bbb', 'ccc'):
+    sys.path.insert(1, os.path.join(SCRIPTS_DIR, folder))
+
+from servers import StandInSite, StandInTCP
+from common import perf
+from common.http_client import PooledSession
+from common.crawl_engine import Category, CrawlEngine, PlaylistLayout
+from common.tcp_scan import scan_latency
+
+BENCHES = ['crawl', 'merge', 'sync', 'probe']
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def result(name, items, wall, latencies_ms=None, http=None, **extra):
+    """统一的结果格式：条目数、墙钟时间、吞吐量和 p50/p99 延迟（毫秒）"""
+    row = {'bench': name, 'items': items, 'wall': round(wall, 3),
+           'per_second': round(items / wall, 1) if wall else None}
+    if http is not None:
+        row['p50_ms'], row['p99_ms'] = http.get('p50_ms'), http.get('p99_ms')
+        row['requests'], row['reuse_rate'] = http.get('requests'), http.get('reuse_rate')
+    elif latencies_ms is not None:
+        p50, p99 = percentile(latencies_ms, 0.5), percentile(latencies_ms, 0.99)
+        row['p50_ms'] = round(p50, 2) if p50 is not None else None
+        row['p99_ms'] = round(p99, 2) if p99 is not None else None
+    row.update(extra)
+    return row
+
+
+@contextlib.contextmanager
+def quiet(enabled=True):
+    """屏蔽被测脚本逐条打印的进度"""
+    if not enabled:
+        yield
+        return
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+# 抓取：列表页 -> 详情页 -> 解析 -> 写播放列表，与 aaa/test1.py 完全相同的代码路径
+def bench_crawl(args):
+    import test1
+
+    rows = []
+    with StandInSite(pages=args.pages, delay=args.delay_ms / 1000, jitter=args.jitter_ms / 1000) as site:
+        test1.SITE_URL = site.base_url
+        for mode in args.crawl_modes:
+            with tempfile.TemporaryDirectory() as folder:
+                layout = PlaylistLayout(folder)
+                perf.start(f"bench_crawl_{mode}")
+                start = time.perf_counter()
+                with quiet(not args.verbose):
+                    if mode == 'threads':
+                        layout.open()
+                        listed, complete = test1.crawl_with_threads(site.listing_urls(), layout)
+                        counts = dict(layout.finish(listed, complete), listed=len(listed), complete=complete)
+                    else:
+                        category = Category('bench', 20, layout, pages=site.listing_pages)
+                        options = dict(site_url=site.base_url, per_host=args.per_host)
+                        if mode == 'pipeline':
+                            engine = test1.PipelineEngine([category], args.parse_workers, **options)
+                        else:
+                            engine = CrawlEngine([category], **options)
+                        counts = asyncio.run(engine.run())[category.name]
+                wall = time.perf_counter() - start
+                report = perf.recorder.report()
+                rows.append(result(f"crawl/{mode}", counts['listed'], wall, http=report.get('http'),
+                                   written=counts['updated'], complete=counts['complete']))
+    return rows
+
+
+# 合并：并发下载 IPDB 源并去重，与 bbb/add_port_script.py 相同的代码路径
+def bench_merge(args):
+    import add_port_script
+
+    with StandInSite(ip_count=args.ips, delay=args.delay_ms / 1000) as site:
+        urls = site.ipdb_urls()
+        start = time.perf_counter()
+        with PooledSession(pool_size=len(urls)) as session, ThreadPoolExecutor(max_workers=len(urls)) as executor:
+            with quiet(not args.verbose):
+                bodies = [body for body, _ in executor.map(lambda url: add_port_script.fetch_source(session, url, {}),
+                                                           urls)]
+            fetched = time.perf_counter()
+            ips, invalid = add_port_script.merge_addresses(bodies)
+            lines = add_port_script.format_ip_with_port(ips)
+        wall = time.perf_counter() - start
+        return [result('merge', args.ips, wall, http=session.stats.as_dict(),
+                       unique=len(lines), invalid=invalid,
+                       fetch_s=round(fetched - start, 3), merge_s=round(wall - (fetched - start), 3))]
+
+
+# 同步：提交列表 -> 并发获取每个提交的文件列表，与 ccc/update_ccc.py 相同的代码路径
+def bench_sync(args):
+    with StandInSite(commits=args.commits, delay=args.delay_ms / 1000) as site:
+        os.environ.update({'GITHUB_API_URL': site.base_url, 'GITHUB_USER': 'u', 'GITHUB_REPO': 'r'})
+        os.environ.pop('GITHUB_TOKEN', None)
+        import update_ccc
+
+        session = update_ccc.make_session()
+        start = time.perf_counter()
+        commits = session.get(f"{site.base_url}/repos/u/r/commits").json()
+        file_urls = {}
+        with ThreadPoolExecutor(max_workers=update_ccc.MAX_WORKERS) as executor:
+            update_ccc.collect_files(session, executor, commits, file_urls)
+        wall = time.perf_counter() - start
+        session.close()
+        return [result('sync', len(commits), wall, http=session.stats.as_dict(), files=len(file_urls))]
+
+
+# 探测：并发 TCP 握手测延迟，与 bbb/generate_port_txt.py 相同的代码路径
+def bench_probe(args):
+    with StandInTCP(accept_delay=args.accept_delay_ms / 1000) as tcp:
+        endpoints = tcp.endpoints(args.endpoints, drop=args.drop, refuse=args.refuse)
+        start = time.perf_counter()
+        results = asyncio.run(scan_latency(endpoints, samples=args.samples, concurrency=args.concurrency,
+                                           timeout=args.probe_timeout))
+        wall = time.perf_counter() - start
+    latencies = [r['tcp'] for r in results if r['tcp'] is not None]
+    return [result('probe', len(endpoints), wall, latencies_ms=latencies,
+                   alive=len(latencies), dead=len(endpoints) - len(latencies))]
+
+
+def print_table(rows):
+    print(f"{'bench':<16}{'items':>8}{'wall s':>9}{'items/s':>10}{'p50 ms':>9}{'p99 ms':>9}  其他")
+    for row in rows:
+        extra = {k: v for k, v in row.items()
+                 if k not in ('bench', 'items', 'wall', 'per_second', 'p50_ms', 'p99_ms')}
+        fmt = lambda value: '-' if value is None else value
+        print(f"{row['bench']:<16}{row['items']:>8}{row['wall']:>9}{fmt(row['per_second']):>10}"
+              f"{fmt(row.get('p50_ms')):>9}{fmt(row.get('p99_ms')):>9}  "
+              + ' '.join(f"{k}={v}" for k, v in extra.items()))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="用本地替身服务器离线测量抓取、合并、同步和探测的性能")
+    parser.add_argument('benches', nargs='*', help=f"要运行的测试（{', '.join(BENCHES)}），默认全部")
+    parser.add_argument('--pages', type=int, default=1000, help="详情页数量（每个列表页 20 个）")
+    parser.add_argument('--crawl-modes', nargs='+', default=['async', 'threads', 'pipeline'],
+                        choices=['async', 'threads', 'pipeline'], help="要测量的抓取模式")
+    parser.add_argument('--parse-workers', type=int, default=os.cpu_count() or 2,
+                        help="pipeline 模式的解析进程数")
+    parser.add_argument('--per-host', type=int, default=8, help="异步抓取每个主机的并发连接数")
+    parser.add_argument('--ips', type=int, default=10000, help="IPDB 源的总行数")
+    parser.add_argument('--commits', type=int, default=100, help="提交列表中的提交数")
+    parser.add_argument('--endpoints', type=int, default=10000, help="探测的端点数")
+    parser.add_argument('--samples', type=int, default=1, help="每个端点的握手次数")
+    parser.add_argument('--concurrency', type=int, default=1000, help="探测并发数")
+    parser.add_argument('--probe-timeout', type=float, default=1.0, help="单次握手超时（秒）")
+    parser.add_argument('--drop', type=float, default=0.01, help="不响应（超时）的端点比例")
+    parser.add_argument('--refuse', type=float, default=0.05, help="拒绝连接的端点比例")
+    parser.add_argument('--accept-delay-ms', type=float, default=0.0, help="TCP 替身每次接受连接前的等待")
+    parser.add_argument('--delay-ms', type=float, default=0.0, help="HTTP 替身每个请求的模拟耗时")
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help="HTTP 替身额外的随机耗时上限")
+    parser.add_argument('--json', default=None, help="把结果另存为 JSON 文件")
+    parser.add_argument('--verbose', action='store_true', help="显示被测脚本的输出")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    unknown = [name for name in args.benches if name not in BENCHES]
+    if unknown:
+        sys.exit(f"未知的测试: {', '.join(unknown)}")
+    runners = {'crawl': bench_crawl, 'merge': bench_merge, 'sync': bench_sync, 'probe': bench_probe}
+    rows = []
+    for name in args.benches or BENCHES:
+        print(f"运行 {name} ...")
+        rows.extend(runners[name](args))
+    print_table(rows)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, indent=2, ensure_ascii=False)
+        print(f"结果已写入 {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import socket
+import threading
+import ipaddress
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.extract import extract_play_list
+
+# 详情页样本，按节目编号替换标题后返回
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common', 'fixtures', 'detail_series.html')
+
+LISTING_RE = re.compile(r'^/index\.php/vod/type/id/(\d+)/page/(\d+)\.html$')
+DETAIL_RE = re.compile(r'^/index\.php/vod/detail/id/(\d+)\.html$')
+COMMIT_RE = re.compile(r'^/repos/[^/]+/[^/]+/commits/(\w+)$')
+IPDB_RE = re.compile(r'^/ipdb/(\d+)\.txt$')
+
+
+def make_ip_lists(total, sources=3, seed=1):
+    """生成 sources 份 IP 列表，共约 total 行：源之间有约 20% 重复，混入少量端口、IPv6、私网和无效行"""
+    rng = random.Random(seed)
+    pool = []
+    while len(pool) < max(1, int(total * 0.8)):
+        ip = ipaddress.IPv4Address(rng.getrandbits(32))
+        if ip.is_global:
+            pool.append(str(ip))
+    lists = [[] for _ in range(sources)]
+    for index in range(total):
+        roll = rng.random()
+        if roll < 0.02:
+            line = f"{ipaddress.IPv6Address((0x2606_4700 << 96) | rng.getrandbits(64))}"
+        elif roll < 0.03:
+            line = f"192.168.{rng.randrange(256)}.{rng.randrange(256)}"
+        elif roll < 0.04:
+            line = "not-an-ip"
+        elif roll < 0.2:
+            line = f"{rng.choice(pool)}:{rng.choice((443, 2053, 8443))}"
+        else:
+            line = rng.choice(pool)
+        lists[index % sources].append(line)
+    return ['\n'.join(lines).encode() for lines in lists]
+
+
+class BenchHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class StandInSite:
+    """本地 HTTP 替身服务器：huyazy 列表页和详情页、GitHub 提交 API 和 IPDB 列表
+
+    delay 为每个请求的模拟服务端耗时（秒），jitter 为额外的随机耗时上限。
+    详情页带 ETag，条件请求命中时返回 304。
+    """
+
+    def __init__(self, pages=1000, per_page=20, delay=0.0, jitter=0.0,
+                 ip_count=1000, ip_sources=3, commits=50, seed=1):
+        self.pages = pages
+        self.per_page = per_page
+        self.delay = delay
+        self.jitter = jitter
+        self.ip_count = ip_count
+        self.ip_sources = ip_sources
+        self.commits = commits
+        self.seed = seed
+        self.requests = 0
+        self.lock = threading.Lock()
+        with open(FIXTURE_PATH, 'rb') as f:
+            self.fixture = f.read()
+        title, _ = extract_play_list(self.fixture)
+        self.fixture_title = (title or '').encode()
+        self.ip_lists = None
+        self.server = None
+        self.base_url = None
+
+    @property
+    def listing_pages(self):
+        return (self.pages + self.per_page - 1) // self.per_page
+
+    def listing_urls(self, type_id=20):
+        return [f"{self.base_url}/index.php/vod/type/id/{type_id}/page/{page}.html"
+                for page in range(1, self.listing_pages + 1)]
+
+    def ipdb_urls(self):
+        return [f"{self.base_url}/ipdb/{index}.txt" for index in range(self.ip_sources)]
+
+    def listing(self, page):
+        first = (page - 1) * self.per_page
+        ids = range(first, min(first + self.per_page, self.pages))
+        items = ''.join(f'<li><a href="/index.php/vod/detail/id/{vid}.html" title="节目{vid}">节目{vid}</a></li>'
+                        for vid in ids)
+        return f'<html><body><ul class="vodlist">{items}</ul></body></html>'.encode()
+
+    def detail(self, vid):
+        if not self.fixture_title:
+            return self.fixture
+        return self.fixture.replace(self.fixture_title, self.fixture_title + f"{vid}".encode())
+
+    def commit_list(self):
+        now = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        return json.dumps([{'sha': f"c{index}", 'url': f"{self.base_url}/repos/u/r/commits/c{index}",
+                            'commit': {'committer': {'date': now}}}
+                           for index in range(self.commits)]).encode()
+
+    def commit_files(self, sha):
+        # 只有最后一个提交带第二个文件，逼着同步脚本看完所有提交
+        files = [{'filename': 'kxwl.txt', 'raw_url': f"{self.base_url}/raw/kxwl.txt"}]
+        if sha == f"c{self.commits - 1}":
+            files.append({'filename': 'kxwl.yaml', 'raw_url': f"{self.base_url}/raw/kxwl.yaml"})
+        return json.dumps({'files': files}).encode()
+
+    def route(self, path, headers):
+        """返回 (状态码, 响应头, 正文)"""
+        match = DETAIL_RE.match(path)
+        if match:
+            vid = int(match.group(1))
+            if vid >= self.pages:
+                return 404, {}, b''
+            etag = f'"{vid}-v1"'
+            if headers.get('If-None-Match') == etag:
+                return 304, {'ETag': etag}, b''
+            return 200, {'Content-Type': 'text/html; charset=utf-8', 'ETag': etag}, self.detail(vid)
+        match = LISTING_RE.match(path)
+        if match:
+            return 200, {'Content-Type': 'text/html; charset=utf-8'}, self.listing(int(match.group(2)))
+        match = IPDB_RE.match(path)
+        if match and int(match.group(1)) < self.ip_sources:
+            return 200, {'Content-Type': 'text/plain'}, self.ip_lists[int(match.group(1))]
+        if re.match(r'^/repos/[^/]+/[^/]+/commits$', path):
+            return 200, {'Content-Type': 'application/json', 'ETag': '"commits-v1"',
+                         'X-RateLimit-Remaining': '4999'}, self.commit_list()
+        match = COMMIT_RE.match(path)
+        if match:
+            return 200, {'Content-Type': 'application/json'}, self.commit_files(match.group(1))
+        if path.startswith('/raw/'):
+            return 200, {'Content-Type': 'text/plain'}, f"content of {path}\n".encode()
+        return 404, {}, b''
+
+    def handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # 响应头和正文一次发出，否则和客户端的延迟确认叠加，每个请求多等约 40ms
+            wbufsize = 64 * 1024
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with site.lock:
+                    site.requests += 1
+                if site.delay or site.jitter:
+                    time.sleep(site.delay + random.uniform(0, site.jitter))
+                status, headers, body = site.route(self.path.split('?')[0], self.headers)
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def start(self):
+        # IP 列表在启动时生成，避免第一批请求把生成时间算进延迟
+        self.ip_lists = make_ip_lists(self.ip_count, self.ip_sources, self.seed)
+        self.server = BenchHTTPServer(('127.0.0.1', 0), self.handler())
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.base_url
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class StandInTCP:
+    """在 127.0.0.0/8 上模拟大量 TCP 端点（Linux 上整个网段都指向本机）
+
+    - 正常端口：监听线程接受连接后立即关闭；accept_delay 大于 0 时每次接受前等待，
+      积压队列满后新连接的握手会变慢甚至超时
+    - 黑洞端口：只监听不接受，队列满后 SYN 被丢弃，探测超时
+    - 关闭端口：没有监听，连接立即被拒绝
+    """
+
+    def __init__(self, accept_delay=0.0, backlog=4096):
+        self.accept_delay = accept_delay
+        self.backlog = backlog
+        self.sockets = []
+        self.running = True
+        self.open_port = self._listen(backlog, accept=True)
+        self.blackhole_port = self._listen(0, accept=False)
+        probe = socket.socket()
+        probe.bind(('127.0.0.1', 0))
+        self.closed_port = probe.getsockname()[1]
+        probe.close()
+
+    def _listen(self, backlog, accept):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(('0.0.0.0', 0))
+        sock.listen(backlog)
+        self.sockets.append(sock)
+        if accept:
+            threading.Thread(target=self._accept_loop, args=(sock,), daemon=True).start()
+        else:
+            # 先占满积压队列（backlog 为 0 时内核仍允许一个），之后的 SYN 都会被丢弃
+            for _ in range(2):
+                filler = socket.socket()
+                filler.setblocking(False)
+                filler.connect_ex(('127.0.0.1', sock.getsockname()[1]))
+                self.sockets.append(filler)
+        return sock.getsockname()[1]
+
+    def _accept_loop(self, sock):
+        while self.running:
+            if self.accept_delay:
+                time.sleep(self.accept_delay)
+            try:
+                conn, _ = sock.accept()
+            except OSError:
+                return
+            conn.close()
+
+    def endpoints(self, count, drop=0.0, refuse=0.0, seed=1):
+        """生成 count 个 (主机, 端口)，按比例分配到黑洞端口和关闭端口"""
+        rng = random.Random(seed)
+        result = []
+        for index in range(count):
+            n = index + 1
+            host = f"127.{(n >> 16) & 255}.{(n >> 8) & 255}.{n & 255}"
+            roll = rng.random()
+            if roll < drop:
+                port = self.blackhole_port
+            elif roll < drop + refuse:
+                port = self.closed_port
+            else:
+                port = self.open_port
+            result.append((host, port))
+        return result
+
+    def close(self):
+        self.running = False
+        for sock in self.sockets:
+            sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,186 @@
+import io
+import json
+import hashlib
+import argparse
+import textwrap
+from collections import namedtuple, defaultdict
+
+import yaml
+
+# 精简后的配置和节点差异文件
+SLIM_FILE = "scripts/ccc/kxwl_slim.yaml"
+DIFF_FILE = "scripts/ccc/kxwl_diff.txt"
+
+# 节点的紧凑记录：identity 为除 name 以外所有字段的哈希，相同即视为同一节点
+Node = namedtuple("Node", ["name", "type", "server", "port", "identity", "lines"])
+
+
+def node_identity(proxy):
+    fields = {k: v for k, v in proxy.items() if k != "name"}
+    return hashlib.sha1(json.dumps(fields, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+def indent_of(line):
+    return len(line) - len(line.lstrip(" "))
+
+
+def iter_sections(lines):
+    """按顶层键切分配置，逐段产出 (键名, 该段的全部行)；不在任何键下的行键名为 None"""
+    key, block = None, []
+    for line in lines:
+        if line.strip() and not line[0].isspace() and not line.startswith("#") and not line.startswith("-"):
+            if block:
+                yield key, block
+            key, block = line.split(":", 1)[0].strip(), []
+        block.append(line)
+    if block:
+        yield key, block
+
+
+def iter_items(section_lines):
+    """把列表段切分为一个个列表项，产出每一项的原始行（不含段首的键行）"""
+    item, item_indent = [], None
+    for line in section_lines[1:]:
+        stripped = line.lstrip(" ")
+        if stripped.startswith("- ") or stripped.rstrip("\n") == "-":
+            if item_indent is None:
+                item_indent = indent_of(line)
+            if indent_of(line) == item_indent:
+                if item:
+                    yield item
+                item = []
+        item.append(line)
+    if item:
+        yield item
+
+
+def parse_node(item_lines):
+    proxy = yaml.safe_load(textwrap.dedent("".join(item_lines)))[0]
+    return Node(str(proxy.get("name")), proxy.get("type"), proxy.get("server"), proxy.get("port"),
+                node_identity(proxy), item_lines)
+
+
+class NodeIndex:
+    """去重后的节点集合，以及按服务器、类型和端口建立的索引"""
+
+    def __init__(self):
+        self.nodes = []
+        self.by_identity = {}
+        self.aliases = {}
+        self.by_server = defaultdict(list)
+        self.by_type = defaultdict(list)
+        self.by_port = defaultdict(list)
+        self.total = 0
+
+    def add(self, node):
+        """加入一个节点；重复节点只记录其名称到保留节点名称的映射"""
+        self.total += 1
+        kept = self.by_identity.get(node.identity)
+        if kept is not None:
+            self.aliases[node.name] = kept.name
+            return False
+        self.by_identity[node.identity] = node
+        self.nodes.append(node)
+        self.by_server[node.server].append(node)
+        self.by_type[node.type].append(node)
+        self.by_port[node.port].append(node)
+        return True
+
+
+def load_nodes(lines):
+    """流式读取配置中的 proxies 段并去重"""
+    index = NodeIndex()
+    for key, block in iter_sections(lines):
+        if key == "proxies":
+            for item in iter_items(block):
+                index.add(parse_node(item))
+    return index
+
+
+def rewrite_group(block, aliases):
+    """改写 proxy-groups 段：被去掉的节点名替换为保留的节点名，同一组内不重复出现"""
+    output, seen = [], set()
+    group_indent = None
+    for line in block:
+        stripped = line.strip()
+        if stripped.startswith("- name:") and (group_indent is None or indent_of(line) == group_indent):
+            group_indent = indent_of(line)
+            seen = set()
+        elif stripped.startswith("- ") and group_indent is not None and indent_of(line) > group_indent:
+            name = yaml.safe_load(stripped[2:])
+            name = aliases.get(str(name), name)
+            if name in seen:
+                continue
+            seen.add(name)
+            if str(name) != yaml.safe_load(stripped[2:]):
+                line = f"{line[:indent_of(line)]}- {name}\n"
+        output.append(line)
+    return output
+
+
+def write_slim(lines, index, out):
+    """逐段写出精简配置：只保留去重后的节点，其余段原样复制"""
+    kept = {node.identity: node.name for node in index.nodes}
+    for key, block in iter_sections(lines):
+        if key == "proxies":
+            out.write(block[0])
+            for item in iter_items(block):
+                node = parse_node(item)
+                if kept.get(node.identity) == node.name:
+                    out.writelines(item)
+        elif key == "proxy-groups":
+            out.writelines(rewrite_group(block, index.aliases))
+        else:
+            out.writelines(block)
+
+
+def describe(node):
+    return f"{node.name} | {node.type} {node.server}:{node.port}"
+
+
+def diff_nodes(previous, current):
+    """按节点身份比较前后两份配置，返回差异文本"""
+    added = [n for n in current.nodes if n.identity not in previous.by_identity]
+    removed = [n for n in previous.nodes if n.identity not in current.by_identity]
+    lines = [f"节点数: {len(previous.nodes)} -> {len(current.nodes)}\n",
+             f"新增 {len(added)} 个节点:\n"]
+    lines += [f"+ {describe(n)}\n" for n in added]
+    lines.append(f"删除 {len(removed)} 个节点:\n")
+    lines += [f"- {describe(n)}\n" for n in removed]
+    return "".join(lines)
+
+
+def process(current_path, previous_text=None, slim_path=SLIM_FILE, diff_path=DIFF_FILE):
+    """生成精简配置；提供上一份配置内容时同时写出差异文件"""
+    with open(current_path, "r", encoding="utf-8") as f:
+        index = load_nodes(f)
+    with open(current_path, "r", encoding="utf-8") as f, open(slim_path, "w", encoding="utf-8") as out:
+        write_slim(f, index, out)
+    print(f"{current_path}: {index.total} proxies, {len(index.nodes)} unique, "
+          f"{len(index.by_server)} servers, types {dict((k, len(v)) for k, v in index.by_type.items())}")
+
+    if previous_text is not None and diff_path:
+        previous = load_nodes(io.StringIO(previous_text))
+        with open(diff_path, "w", encoding="utf-8") as f:
+            f.write(diff_nodes(previous, index))
+        print(f"Node diff written to {diff_path}")
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对 Clash 配置中的节点去重并生成精简配置")
+    parser.add_argument("config", nargs="?", default="scripts/ccc/kxwl.yaml", help="Clash 配置文件")
+    parser.add_argument("--previous", default=None, help="上一份配置，用于生成节点差异")
+    parser.add_argument("--slim", default=SLIM_FILE, help="精简配置输出路径")
+    parser.add_argument("--diff", default=DIFF_FILE, help="节点差异输出路径")
+    args = parser.parse_args()
+
+    previous_text = None
+    if args.previous:
+        with open(args.previous, "r", encoding="utf-8") as f:
+            previous_text = f.read()
+    process(args.config, previous_text, args.slim, args.diff)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,73 +1,193 @@
 import requests
 from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
 import os
+import sys
+import json
+import tempfile
 
-# 配置 GitHub 用户和仓库信息
-GITHUB_USER = "xinyex"
-GITHUB_REPO = "ks"
+import yaml
+import kxwl_nodes
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.http_client import PooledSession, get
+from common import perf
+
+# 配置 GitHub 用户和仓库信息（可通过环境变量覆盖）
+GITHUB_USER = os.environ.get("GITHUB_USER", "xinyex")
+GITHUB_REPO = os.environ.get("GITHUB_REPO", "ks")
+
+# GitHub API 地址，测试时可指向本地的模拟服务器
+GITHUB_API_URL = os.environ.get("GITHUB_API_URL", "https://api.github.com").rstrip("/")
 
 # GitHub API URL
-commits_url = f"https://api.github.com/repos/{GITHUB_USER}/{GITHUB_REPO}/commits"
+commits_url = f"{GITHUB_API_URL}/repos/{GITHUB_USER}/{GITHUB_REPO}/commits"
 files_save_path = "scripts/ccc/"  # 文件保存目录
 
+# 同步状态：提交列表的 ETag 和上一次处理到的提交 SHA
+state_path = os.path.join(files_save_path, "sync_state.json")
+
+# 并发请求数和单次请求超时（秒）
+MAX_WORKERS = 4
+REQUEST_TIMEOUT = (10, 30)
+
 # 确保保存路径存在
 os.makedirs(files_save_path, exist_ok=True)
 
+
+class RateLimitExceeded(Exception):
+    """API 配额已用完"""
+
+
+def make_session():
+    """创建共享会话；设置了 GITHUB_TOKEN 时使用认证请求以获得更高配额"""
+    headers = {"Accept": "application/vnd.github+json"}
+    token = os.environ.get("GITHUB_TOKEN")
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    return PooledSession(pool_size=MAX_WORKERS, timeout=REQUEST_TIMEOUT, headers=headers)
+
+
+def check_rate_limit(response):
+    """配额用完时抛出 RateLimitExceeded，并给出恢复时间"""
+    remaining = response.headers.get("X-RateLimit-Remaining")
+    if response.status_code in (403, 429) and remaining == "0":
+        reset = response.headers.get("X-RateLimit-Reset")
+        when = datetime.fromtimestamp(int(reset), timezone.utc) if reset else "unknown"
+        raise RateLimitExceeded(f"GitHub API rate limit exceeded, resets at {when}")
+    return remaining
+
+
+def load_state():
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state):
+    fd, tmp_path = tempfile.mkstemp(dir=files_save_path)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, state_path)
+
+
+def fetch_commit_files(session, commit):
+    """获取一个提交中更改的文件列表"""
+    response = get(session, commit["url"])
+    check_rate_limit(response)
+    response.raise_for_status()
+    return response.json().get("files", [])
+
+
+def fetch_raw(session, raw_url):
+    response = get(session, raw_url)
+    check_rate_limit(response)
+    response.raise_for_status()
+    return response.text
+
+
+def collect_files(session, executor, commits, file_urls):
+    """并发获取一批提交的文件列表，按提交顺序收集前两个不同的文件"""
+    for files in executor.map(lambda commit: fetch_commit_files(session, commit), commits):
+        for file_info in files:
+            # 如果此文件未被添加，则记录其下载地址
+            if file_info["filename"] not in file_urls:
+                file_urls[file_info["filename"]] = file_info["raw_url"]
+            # 如果已经找到两个文件，则停止查找
+            if len(file_urls) >= 2:
+                return
+
+
 def fetch_and_save_recent_files():
+    perf.start('kxwl_sync')
+    state = load_state()
+    session = make_session()
     try:
-        # 请求 GitHub API 获取最近的提交
-        response = requests.get(commits_url)
+        # 请求 GitHub API 获取最近的提交；列表未变化时返回 304，不消耗配额
+        headers = {}
+        if state.get("commits_etag"):
+            headers["If-None-Match"] = state["commits_etag"]
+        with perf.stage('commits'):
+            response = get(session, commits_url, headers=headers)
+        remaining = check_rate_limit(response)
+        if response.status_code == 304:
+            print("No new commits upstream (304 Not Modified).")
+            return
         response.raise_for_status()
         commits = response.json()
-        
+        print(f"Fetched commit list, rate limit remaining: {remaining}")
+
         # 计算一天前的时间
         one_day_ago = datetime.now(timezone.utc) - timedelta(days=1)
         print(f"One day ago: {one_day_ago}")
-        
-        # 存储文件内容和 URL 的字典
-        file_content_dict = {}
-        
-        # 遍历提交记录，找到最近一天内的更改
-        for commit in commits:
-            commit_date = datetime.strptime(commit["commit"]["committer"]["date"], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
-            if commit_date >= one_day_ago:
-                # 获取此提交中更改的文件
-                files_url = commit["url"]
-                files_response = requests.get(files_url)
-                files_response.raise_for_status()
-                files = files_response.json().get("files", [])
-                
-                # 下载每个文件的内容
-                for file_info in files:
-                    raw_url = file_info["raw_url"]
-                    file_name = file_info["filename"]
-                    
-                    # 如果此文件未被添加，则下载其内容
-                    if file_name not in file_content_dict:
-                        file_content = requests.get(raw_url).text
-                        file_content_dict[file_name] = file_content
-                        
-                    # 如果已经找到两个文件，则停止查找
-                    if len(file_content_dict) >= 2:
-                        break
-            if len(file_content_dict) >= 2:
+
+        # 最近一天内的提交，并找出上一次处理之后的新提交
+        recent = [commit for commit in commits
+                  if datetime.strptime(commit["commit"]["committer"]["date"], "%Y-%m-%dT%H:%M:%SZ")
+                  .replace(tzinfo=timezone.utc) >= one_day_ago]
+        new_count = len(recent)
+        for index, commit in enumerate(recent):
+            if commit["sha"] == state.get("last_sha"):
+                new_count = index
                 break
 
+        if new_count == 0:
+            print("No new commits since the last sync.")
+            state["commits_etag"] = response.headers.get("ETag")
+            save_state(state)
+            return
+
+        # 先并发查看新提交；不足两个文件时再继续查看一天内更早的提交
+        file_urls = {}
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor, perf.stage('files'):
+            collect_files(session, executor, recent[:new_count], file_urls)
+            if len(file_urls) < 2:
+                collect_files(session, executor, recent[new_count:], file_urls)
+
+            # 并发下载每个文件的内容
+            file_contents = list(executor.map(lambda url: fetch_raw(session, url),
+                                              list(file_urls.values())[:2]))
+
         # 将内容保存到固定文件 kxwl.txt 和 kxwl.yaml
-        file_contents = list(file_content_dict.values())
         if len(file_contents) >= 2:
             with open(os.path.join(files_save_path, "kxwl.txt"), "w") as txt_file:
                 txt_file.write(file_contents[0])
 
-            with open(os.path.join(files_save_path, "kxwl.yaml"), "w") as yaml_file:
+            # 保留上一份配置，用于生成节点差异
+            yaml_path = os.path.join(files_save_path, "kxwl.yaml")
+            previous_yaml = None
+            if os.path.exists(yaml_path):
+                with open(yaml_path, "r", encoding="utf-8") as yaml_file:
+                    previous_yaml = yaml_file.read()
+
+            with open(yaml_path, "w") as yaml_file:
                 yaml_file.write(file_contents[1])
 
+            # 去重节点，写出精简配置和与上一份配置的差异
+            try:
+                with perf.stage('nodes'):
+                    kxwl_nodes.process(yaml_path, previous_yaml)
+            except (yaml.YAMLError, IndexError, TypeError, AttributeError) as e:
+                print("Failed to build the slim config:", e)
+
+            state["last_sha"] = recent[0]["sha"]
             print("kxwl.txt and kxwl.yaml files updated successfully.")
         else:
             print("Less than 2 files found for the last day.")
 
-    except requests.RequestException as e:
+        state["commits_etag"] = response.headers.get("ETag")
+        save_state(state)
+
+    except (requests.RequestException, RateLimitExceeded) as e:
         print("Failed to fetch or download files:", e)
+        # 以非零退出码结束，工作流和调度进程都把这次同步记为失败
+        sys.exit(1)
+    finally:
+        print(session.summary())
+        session.close()
+        perf.finish(session.stats)
 
 if __name__ == "__main__":
     fetch_and_save_recent_files()
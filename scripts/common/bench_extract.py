@@ -0,0 +1,60 @@
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import extract
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def time_per_call(func, content, repeat):
+    """返回单次调用的平均耗时（毫秒）"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(content)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比快速提取与 BeautifulSoup 解析的耗时和结果")
+    parser.add_argument('--repeat', type=int, default=200, help="每个页面重复解析的次数")
+    parser.add_argument('--fixtures', default=FIXTURE_DIR, help="HTML 样本目录")
+    args = parser.parse_args()
+
+    print(f"{'页面':<24}{'路径':<14}{'soup ms':>10}{'fast ms':>10}{'加速':>8}")
+    mismatches = 0
+    for name in sorted(os.listdir(args.fixtures)):
+        if not name.endswith('.html'):
+            continue
+        with open(os.path.join(args.fixtures, name), 'rb') as f:
+            content = f.read()
+
+        for label, fast, full in (
+            ('play', extract.fast_play_list, extract.soup_play_list),
+            ('detail', lambda c: extract.fast_detail(c, "https://huyazy.com"),
+             lambda c: extract.soup_detail(c, "https://huyazy.com")),
+        ):
+            expected = full(content)
+            actual = fast(content)
+            path = 'fast' if actual is not None else 'soup'
+            if actual is not None and actual != expected:
+                mismatches += 1
+                print(f"结果不一致: {name} ({label})")
+                print(f"  soup: {expected!r}")
+                print(f"  fast: {actual!r}")
+
+            soup_ms = time_per_call(full, content, args.repeat)
+            fast_ms = time_per_call(fast, content, args.repeat)
+            speedup = f"{soup_ms / fast_ms:>7.1f}x" if path == 'fast' else f"{'-':>8}"
+            print(f"{name:<24}{label + '/' + path:<14}{soup_ms:>10.3f}{fast_ms:>10.3f}{speedup}")
+
+    if mismatches:
+        print(f"共有 {mismatches} 处结果不一致")
+        sys.exit(1)
+    print("快速路径结果与 BeautifulSoup 完全一致")
+
+
+if __name__ == "__main__":
+    main()
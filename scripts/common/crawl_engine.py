@@ -0,0 +1,450 @@
+# 多分类抓取引擎：多个分类在同一个进程中并发抓取
+#
+# 所有分类共用一个 aiohttp 连接池、详情页响应缓存和已访问详情页表，
+# 同一个详情页无论出现在几个分类的列表页中，每次运行只请求一次。
+# 每个分类有自己的输出布局（见 PlaylistLayout / ShowFolderLayout / PackedLayout）。
+# scripts/crawl.py 一次抓取全部分类；aaa/test1.py 和 test.py 各自只配置一个分类。
+import os
+import time
+import random
+import shutil
+import asyncio
+from concurrent.futures import wait
+from urllib.parse import urljoin
+
+import aiohttp
+
+from common.http_client import DEFAULT_HEADERS, ClientStats, get_async, make_async_session
+from common.extract import extract_play_list, extract_detail, extract_listing_entries
+from common.frontier import STOP_AFTER_PAGES, MAX_PAGES, vod_id_of, content_hash
+from common.playlist_store import PlaylistStore, atomic_write, safe_name
+from common.m3u8_check import M3U8Validator
+from common import perf
+
+# 站点地址
+SITE_URL = "https://huyazy.com"
+
+# 列表页请求头：带防缓存字段；详情页由条件请求决定是否重新下载
+LISTING_HEADERS = {
+    **DEFAULT_HEADERS,
+    'Cache-Control': 'no-store, no-cache, must-revalidate, post-check=0, pre-check=0',
+    'Pragma': 'no-cache',
+    'Expires': '0'
+}
+DETAIL_HEADERS = dict(DEFAULT_HEADERS)
+
+# 每个主机的最大并发连接数（所有分类合计）
+PER_HOST_LIMIT = 8
+
+# 单次请求超时（秒）
+CONNECT_TIMEOUT = 10
+REQUEST_TIMEOUT = 30
+
+
+# 从播放列表详情页解析 (文件名, [(集标题, m3u8 链接)])；模块级函数，可以交给解析进程池
+def parse_playlist(content, site_url=SITE_URL):
+    title, links = extract_play_list(content)
+    filename = f"{safe_name(title or 'default_title')}.m3u"
+    m3u8_links = [(episode_title, href if href.startswith('http') else f"{site_url}{href}")
+                  for episode_title, href in links if href.endswith('.m3u8')]
+    return filename, m3u8_links
+
+
+# 在解析进程中运行：解析详情页并返回耗时，由主进程计入 parse 阶段
+def timed_parse(parse, content, site_url):
+    start = time.perf_counter()
+    result = parse(content, site_url)
+    return result, time.perf_counter() - start
+
+
+class OutputLayout:
+    """分类输出布局的公共接口
+
+    parse 为模块级解析函数 parse(正文, 站点地址)，返回值最后一项是剧集链接列表；
+    open() 在抓取前调用，save() 保存一个详情页，finish() 在全部详情页处理完后调用并返回统计，
+    运行中途失败时调用 abort()。
+    """
+
+    def open(self):
+        pass
+
+    async def save(self, engine, url, parsed):
+        raise NotImplementedError
+
+    def finish(self, listed_urls, complete):
+        return {}
+
+    def abort(self):
+        pass
+
+
+class PlaylistLayout(OutputLayout):
+    """每个节目一个 .m3u 文件（scripts/aaa/test1.py 的布局），内容未变化时不重写"""
+
+    parse = staticmethod(parse_playlist)
+
+    def __init__(self, folder_path, validate=False):
+        self.folder_path = folder_path
+        self.validate = validate
+        self.store = None
+
+    def open(self):
+        self.store = PlaylistStore(self.folder_path)
+
+    async def check(self, engine, url, parsed):
+        """检查剧集链接，返回去掉失效剧集后的解析结果，没有可用剧集时返回 None
+
+        详情页收到 304（内容未变化）时只用缓存的检查结果，不再发请求。
+        """
+        filename, m3u8_links = parsed
+        if m3u8_links and self.validate and engine.validator is not None:
+            with perf.stage('validate'):
+                m3u8_links = await engine.validator.validate(m3u8_links, recheck=url not in engine.unchanged)
+        if not m3u8_links:
+            print(f"No M3U8 links found for {url}")
+            return None
+        return filename, m3u8_links
+
+    def write(self, url, parsed):
+        filename, m3u8_links = parsed
+        file_path = os.path.join(self.folder_path, filename)
+        with perf.stage('write'):
+            written = self.store.write(url, filename, m3u8_links)
+        print(f"M3U8 链接已成功写入 {file_path} 文件中" if written else f"内容未变化，跳过 {file_path}")
+
+    async def save(self, engine, url, parsed):
+        parsed = await self.check(engine, url, parsed)
+        if parsed is not None:
+            self.write(url, parsed)
+
+    def finish(self, listed_urls, complete):
+        """清理下架节目并保存清单，返回统计"""
+        removed = self.store.finish(listed_urls, complete)
+        for file_name in removed:
+            print(f"已删除下架节目: {os.path.join(self.folder_path, file_name)}")
+        return {'updated': self.store.updated, 'unchanged': self.store.unchanged, 'removed': len(removed)}
+
+
+class ShowFolderLayout(OutputLayout):
+    """每个节目一个文件夹，每集一个 .m3u，外加封面 poster.jpg（scripts/test.py 的布局）
+
+    posters 为 PosterDownloader，为 None 时不下载封面；clear 为 True 时抓取前清空整个目录。
+    """
+
+    parse = staticmethod(extract_detail)
+
+    def __init__(self, folder_path, posters=None, clear=False):
+        self.folder_path = folder_path
+        self.posters = posters
+        self.clear = clear
+        self.saved = 0
+        self.episodes = 0
+
+    def open(self):
+        if self.clear and os.path.exists(self.folder_path):
+            shutil.rmtree(self.folder_path)
+            print(f"已删除文件夹: {self.folder_path}")
+        os.makedirs(self.folder_path, exist_ok=True)
+
+    async def save(self, engine, url, parsed):
+        title, poster_url, m3u8_links = parsed
+        if not m3u8_links:
+            print(f"未找到 M3U8 链接: {url}")
+            return
+        title = safe_name(title)
+        show_folder = os.path.join(self.folder_path, title)
+        os.makedirs(show_folder, exist_ok=True)
+        if poster_url and self.posters is not None:
+            self.posters.submit(urljoin(url, poster_url), os.path.join(show_folder, 'poster.jpg'))
+
+        with perf.stage('write'):
+            for episode_title, link in m3u8_links:
+                # 只保留 $ 前的标题部分
+                raw_title = episode_title.split('$')[0].strip()
+                cleaned_title = safe_name(raw_title).replace(" ", "")
+                data = f"#EXTM3U\n#EXTINF:-1,{raw_title}\n{link}\n".encode('utf-8')
+                atomic_write(os.path.join(show_folder, f"{title}_{cleaned_title}.m3u"), data)
+        self.saved += 1
+        self.episodes += len(m3u8_links)
+        print(f"已写入 {show_folder}（{len(m3u8_links)} 集）")
+
+    def finish(self, listed_urls, complete):
+        return {'shows': self.saved, 'episodes': self.episodes}
+
+
+class PackedLayout(OutputLayout):
+    """每个节目一个合并播放列表加 index.json，在新版本目录中构建后一次切换（见 PackedOutput）
+
+    封面下载到新版本目录中，切换和放弃前都先等本布局提交的封面下载结束。
+    """
+
+    parse = staticmethod(extract_detail)
+
+    def __init__(self, packed, posters=None):
+        self.packed = packed
+        self.posters = posters
+        self.futures = []
+
+    def open(self):
+        self.packed.start()
+
+    async def save(self, engine, url, parsed):
+        title, poster_url, m3u8_links = parsed
+        if not m3u8_links:
+            print(f"未找到 M3U8 链接: {url}")
+            return
+        image_url = urljoin(url, poster_url) if poster_url and self.posters is not None else None
+        with perf.stage('write'):
+            poster_path = self.packed.add_show(title, url, m3u8_links, image_url)
+        if poster_path:
+            self.futures.append(self.posters.submit(image_url, poster_path))
+        print(f"已写入 {title}（{len(m3u8_links)} 集）")
+
+    def finish(self, listed_urls, complete):
+        wait(self.futures)
+        with perf.stage('swap'):
+            swapped = self.packed.commit()
+        return {'shows': self.packed.added, 'total': len(self.packed.index), 'swapped': swapped}
+
+    def abort(self):
+        for future in self.futures:
+            future.cancel()
+        wait(self.futures)
+        self.packed.abort()
+
+
+class Category:
+    """一个要抓取的分类
+
+    pages 为抓取的列表页数；catalog 为 True 时改为按进度库翻完整个分类，
+    full、stop_after、max_pages 的含义与 aaa/test1.py 的 catalog 模式相同。
+    """
+
+    def __init__(self, name, type_id, layout, pages=2, catalog=False, full=False,
+                 stop_after=STOP_AFTER_PAGES, max_pages=MAX_PAGES):
+        self.name = name
+        self.type_id = type_id
+        self.layout = layout
+        self.pages = pages
+        self.catalog = catalog
+        self.full = full
+        self.stop_after = stop_after
+        self.max_pages = max_pages
+
+
+class CrawlEngine:
+    """在一个事件循环中并发抓取多个分类
+
+    cache 为 ResponseCache，frontier 为 CrawlFrontier（有 catalog 分类时必填），
+    limiter 为 OriginRateLimiter（按来源限速，不需要时为 None），
+    parse_pool 为解析详情页用的进程池，为 None 时在事件循环中直接解析。
+    """
+
+    def __init__(self, categories, site_url=SITE_URL, per_host=PER_HOST_LIMIT,
+                 connect_timeout=CONNECT_TIMEOUT, request_timeout=REQUEST_TIMEOUT,
+                 cache=None, frontier=None, limiter=None, parse_pool=None):
+        self.categories = categories
+        self.site_url = site_url
+        self.per_host = per_host
+        self.connect_timeout = connect_timeout
+        self.request_timeout = request_timeout
+        self.cache = cache
+        self.frontier = frontier
+        self.limiter = limiter
+        self.parse_pool = parse_pool
+        self.stats = ClientStats()
+        self.session = None
+        self.validator = None
+        # 详情页编号 -> 抓取任务，所有分类共用
+        self.visited = {}
+        self.shared = 0
+        # 收到 304、正文来自缓存的详情页地址，这些节目不再检查剧集链接
+        self.unchanged = set()
+
+    def listing_url(self, type_id, page):
+        return f"{self.site_url}/index.php/vod/type/id/{type_id}/page/{page}.html?ac=detail"
+
+    async def fetch_listing(self, url):
+        """请求列表页，失败时返回 None"""
+        try:
+            with perf.stage('listing'):
+                response = await get_async(self.session, f"{url}?t={random.randint(1, 100000)}",
+                                           headers=LISTING_HEADERS, limiter=self.limiter)
+                response.raise_for_status()
+                return await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"请求失败: {url} {e!r}")
+            return None
+
+    def detail(self, url):
+        """返回详情页正文的抓取任务；同一个详情页只请求一次，之后的调用共享结果"""
+        key = vod_id_of(url) or url
+        task = self.visited.get(key)
+        if task is None:
+            task = self.visited[key] = asyncio.ensure_future(self._fetch_detail(url))
+        else:
+            self.shared += 1
+        return task
+
+    async def _fetch_detail(self, url):
+        """条件请求详情页，命中 304 时读取缓存的正文；失败时返回 None"""
+        entry = self.cache.get(url) if self.cache is not None else None
+        headers = dict(DETAIL_HEADERS)
+        if self.cache is not None:
+            headers.update(self.cache.conditional_headers(entry))
+        try:
+            with perf.stage('detail'):
+                response = await get_async(self.session, url, headers=headers, limiter=self.limiter)
+                if response.status == 304 and entry:
+                    self.cache.revalidated(url)
+                    body = self.cache.load_body(entry)
+                    if body is not None:
+                        self.cache.record(True)
+                        self.unchanged.add(url)
+                        return body
+                    # 缓存正文丢失，重新完整下载一次
+                    response = await get_async(self.session, url, headers=DETAIL_HEADERS, limiter=self.limiter)
+                response.raise_for_status()
+                body = await response.read()
+            if self.cache is not None:
+                self.cache.record(False)
+                self.cache.store(url, body, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+            return body
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"请求失败: {url} {e!r}")
+            if self.cache is not None:
+                self.cache.record(False)
+            return None
+
+    async def parse(self, category, body):
+        """按分类的布局解析详情页；有进程池时在子进程中解析"""
+        if self.parse_pool is None:
+            with perf.stage('parse'):
+                return category.layout.parse(body, self.site_url)
+        loop = asyncio.get_running_loop()
+        parsed, seconds = await loop.run_in_executor(self.parse_pool, timed_parse,
+                                                     category.layout.parse, body, self.site_url)
+        perf.recorder.add_time('parse', seconds)
+        return parsed
+
+    async def process_detail(self, category, url, vod_id=None):
+        """按分类的布局解析并保存一个详情页；catalog 分类同时更新进度库"""
+        body = await self.detail(url)
+        parsed = None
+        if body is not None:
+            parsed = await self.parse(category, body)
+        if category.catalog:
+            if parsed is None or not parsed[-1]:
+                self.frontier.fail_detail(category.type_id, vod_id)
+            elif self.frontier.record_detail(category.type_id, vod_id, content_hash(*parsed)):
+                perf.count('catalog_changed')
+        if parsed is not None:
+            await category.layout.save(self, url, parsed)
+
+    async def crawl_pages(self, category):
+        """抓取分类的前 pages 个列表页，返回 (列表页中的详情页地址, 列表页是否全部抓取成功)"""
+        listed = set()
+
+        async def crawl_listing(page):
+            content = await self.fetch_listing(self.listing_url(category.type_id, page))
+            if content is None:
+                return False
+            tasks = []
+            for url, _ in extract_listing_entries(content, self.site_url):
+                if url not in listed:
+                    listed.add(url)
+                    tasks.append(self.process_detail(category, url))
+            await asyncio.gather(*tasks)
+            return True
+
+        results = await asyncio.gather(*(crawl_listing(page) for page in range(1, category.pages + 1)))
+        return listed, all(results)
+
+    async def crawl_catalog(self, category):
+        """按进度库翻完整个分类，返回值与 crawl_pages 相同
+
+        首次运行（或 full=True）翻到最后一页；之后连续 stop_after 页没有新节目或变化时停止翻页。
+        单次最多翻 max_pages 页，没翻完的下次运行接着翻。每个列表页的详情页在翻下一页的同时并发抓取。
+        """
+        frontier, type_id = self.frontier, category.type_id
+        page, full = frontier.begin(type_id, category.full)
+        print(f"{category.name}（分类 {type_id}）从第 {page} 页开始{'完整' if full else '增量'}翻页")
+        scheduled = set()
+        tasks = []
+
+        def schedule(batch):
+            for vod_id, url in batch:
+                if vod_id not in scheduled:
+                    scheduled.add(vod_id)
+                    tasks.append(asyncio.ensure_future(self.process_detail(category, url, vod_id)))
+
+        # 先补抓上次中断或失败遗留的详情页
+        schedule(frontier.pending(type_id))
+        more = not frontier.paging_done(type_id)
+        previous = None
+        budget = category.max_pages
+        while more:
+            if budget <= 0:
+                print(f"{category.name} 已翻 {category.max_pages} 页，下次运行从第 {page} 页继续")
+                break
+            budget -= 1
+            content = await self.fetch_listing(self.listing_url(type_id, page))
+            if content is None:
+                print(f"{category.name} 列表页第 {page} 页抓取失败，下次运行从这一页继续")
+                break
+            entries = extract_listing_entries(content, self.site_url)
+            urls = [url for url, _ in entries]
+            # 页码超出范围时有的站点会重复返回最后一页
+            if urls == previous:
+                entries = []
+            previous = urls
+            queued, more = frontier.record_listing(type_id, page, entries, category.stop_after)
+            perf.count('catalog_pages')
+            print(f"{category.name} 列表页第 {page} 页: {len(entries)} 个节目，{len(queued)} 个新增或有更新")
+            schedule(queued)
+            page += 1
+        await asyncio.gather(*tasks)
+
+        complete, listed = frontier.finish(type_id)
+        counts = frontier.stats(type_id)
+        print(f"{category.name}（分类 {type_id}）共 {counts['vods']} 个节目，本次抓取 {len(scheduled)} 个，"
+              f"{counts['pending']} 个待重试")
+        perf.count('catalog_details', len(scheduled))
+        return listed, complete
+
+    async def crawl_category(self, category):
+        category.layout.open()
+        if category.catalog:
+            return await self.crawl_catalog(category)
+        return await self.crawl_pages(category)
+
+    async def run(self):
+        """并发抓取全部分类，返回 {分类名: 统计}；中途失败时放弃各分类未完成的输出"""
+        try:
+            async with make_async_session(per_host=self.per_host, connect_timeout=self.connect_timeout,
+                                          timeout=self.request_timeout, stats=self.stats) as session:
+                self.session = session
+                if any(getattr(category.layout, 'validate', False) for category in self.categories):
+                    self.validator = M3U8Validator(session)
+                results = await asyncio.gather(*(self.crawl_category(category) for category in self.categories))
+        except BaseException:
+            for category in self.categories:
+                category.layout.abort()
+            raise
+        finally:
+            self.session = None
+
+        summary = {}
+        for category, (listed, complete) in zip(self.categories, results):
+            summary[category.name] = dict(category.layout.finish(listed, complete),
+                                          listed=len(listed), complete=complete)
+        if self.validator is not None:
+            self.validator.save()
+            checks = self.validator.stats
+            print(f"检查剧集链接 {checks['checked']} 条，可用 {checks['alive']} 条，失效 {checks['dead']} 条，"
+                  f"复用检查结果 {checks['cached']} 条")
+            perf.section('validate', checks)
+        perf.count('details_fetched', len(self.visited))
+        perf.count('details_shared', self.shared)
+        perf.section('http', self.stats.as_dict())
+        return summary
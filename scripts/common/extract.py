@@ -0,0 +1,230 @@
+import re
+import html
+from urllib.parse import urljoin
+from bs4 import BeautifulSoup
+
+# 快速路径 / 回退到 BeautifulSoup 的次数，便于观察页面结构是否发生变化
+STATS = {'fast': 0, 'fallback': 0}
+
+TAG_RE = re.compile(r'<(/?)([a-zA-Z][\w:-]*)([^>]*)>')
+ATTR_RE = re.compile(r'''([^\s"'<>/=]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+)))?''')
+TEXT_SPLIT_RE = re.compile(r'<!--.*?-->|</?[a-zA-Z][^>]*>', re.S)
+SCRIPT_RE = re.compile(r'<script\b[^>]*>(.*?)</script\s*>', re.S | re.I)
+ANCHOR_RE = re.compile(r'<a\b([^>]*)>(.*?)</a\s*>', re.S | re.I)
+M3U8_IN_SCRIPT_RE = re.compile(r'(http[s]?://[^\s]+\.m3u8)')
+
+
+def parse_attrs(attr_text):
+    """解析标签属性，与 html.parser 一样把属性名转小写并反转义属性值"""
+    attrs = {}
+    for match in ATTR_RE.finditer(attr_text.rstrip('/')):
+        name = match.group(1).lower()
+        if name in attrs:
+            continue
+        value = next((v for v in match.group(2, 3, 4) if v is not None), '')
+        attrs[name] = html.unescape(value)
+    return attrs
+
+
+def text_of(fragment):
+    """等价于 BeautifulSoup 的 get_text(strip=True)"""
+    pieces = (html.unescape(piece).strip() for piece in TEXT_SPLIT_RE.split(fragment))
+    return ''.join(piece for piece in pieces if piece)
+
+
+def find_elements(doc, tag_name, match):
+    """按文档顺序返回满足条件的元素 (属性, 内部 HTML)，只在同名标签内统计嵌套深度"""
+    results = []
+    pattern = re.compile(r'<(/?)%s\b([^>]*)>' % tag_name, re.I)
+    pos = 0
+    while True:
+        opening = None
+        for m in pattern.finditer(doc, pos):
+            if not m.group(1) and match(parse_attrs(m.group(2))):
+                opening = m
+                break
+        if opening is None:
+            return results
+
+        depth = 1
+        for m in pattern.finditer(doc, opening.end()):
+            depth += -1 if m.group(1) else 1
+            if depth == 0:
+                results.append((parse_attrs(opening.group(2)), doc[opening.end():m.start()]))
+                pos = m.end()
+                break
+        else:
+            # 没有找到闭合标签，页面结构异常
+            raise ValueError(f"unclosed <{tag_name}>")
+
+
+def has_class(name):
+    return lambda attrs: name in attrs.get('class', '').split()
+
+
+def has_id(name):
+    return lambda attrs: attrs.get('id') == name
+
+
+def decode(content):
+    if isinstance(content, bytes):
+        return content.decode('utf-8')
+    return content
+
+
+def first_h2_text(fragment):
+    h2 = find_elements(fragment, 'h2', lambda attrs: True)
+    return text_of(h2[0][1]) if h2 else None
+
+
+# ---------- 播放列表页（scripts/aaa/test1.py） ----------
+
+def fast_play_list(content, play_id='play_2'):
+    """快速路径：只截取 div.vodInfo 和 #play_2 两段 HTML；结构不符时返回 None"""
+    try:
+        doc = decode(content)
+        info = find_elements(doc, 'div', has_class('vodInfo'))
+        plays = [inner for tag in ('div', 'ul')
+                 for _, inner in find_elements(doc, tag, has_id(play_id))]
+    except (UnicodeDecodeError, ValueError):
+        return None
+    if not info or len(plays) != 1:
+        return None
+
+    title = first_h2_text(info[0][1])
+    if title is None:
+        return None
+
+    links = []
+    for attr_text, inner in ANCHOR_RE.findall(plays[0]):
+        href = parse_attrs(attr_text).get('href')
+        if href:
+            links.append((text_of(inner), href))
+    return title, links
+
+
+def soup_play_list(content, play_id='play_2'):
+    """完整路径：构建 BeautifulSoup 树后读取同样的字段"""
+    soup = BeautifulSoup(content, 'html.parser')
+    title = None
+    info_div = soup.find('div', class_='vodInfo')
+    if info_div:
+        title_tag = info_div.find('h2')
+        if title_tag:
+            title = title_tag.get_text(strip=True)
+
+    links = []
+    for a_tag in soup.select(f'#{play_id} a'):
+        href = a_tag.get('href')
+        if href:
+            links.append((a_tag.get_text(strip=True), href))
+    return title, links
+
+
+def extract_play_list(content, play_id='play_2'):
+    """返回 (标题或 None, [(集标题, href), ...])，优先使用快速路径"""
+    result = fast_play_list(content, play_id)
+    if result is not None:
+        STATS['fast'] += 1
+        return result
+    STATS['fallback'] += 1
+    return soup_play_list(content, play_id)
+
+
+# ---------- 综艺详情页（scripts/test.py） ----------
+
+def fast_detail(content, base_url):
+    """快速路径：读取标题、封面和脚本中的 m3u8 链接；结构不符时返回 None"""
+    try:
+        doc = decode(content)
+        info = find_elements(doc, 'div', has_class('vodInfo'))
+        img_divs = find_elements(doc, 'div', has_class('vodImg'))
+    except (UnicodeDecodeError, ValueError):
+        return None
+    if not info or not img_divs:
+        return None
+
+    title = first_h2_text(info[0][1])
+    img = TAG_RE.search(img_divs[0][1])
+    while img and (img.group(1) or img.group(2).lower() != 'img'):
+        img = TAG_RE.search(img_divs[0][1], img.end())
+    if title is None or img is None or 'src' not in parse_attrs(img.group(3)):
+        return None
+    poster_url = parse_attrs(img.group(3))['src']
+
+    m3u8_links = []
+    for script_text in SCRIPT_RE.findall(doc):
+        if '.m3u8' in script_text:
+            for m3u8_url in M3U8_IN_SCRIPT_RE.findall(script_text):
+                m3u8_links.append(('Episode', m3u8_url))
+
+    if not m3u8_links:
+        if re.search(r'<(iframe|source)\b', doc, re.I):
+            return None
+        for attr_text, inner in ANCHOR_RE.findall(doc):
+            attrs = parse_attrs(attr_text)
+            href = attrs.get('href') or attrs.get('src')
+            if href and '.m3u8' in href:
+                full_link = href if href.startswith('http') else urljoin(base_url, href)
+                m3u8_links.append((text_of(inner) or "Episode", full_link))
+
+    return title, poster_url, m3u8_links
+
+
+def soup_detail(content, base_url):
+    """完整路径：与原来的 BeautifulSoup 解析逻辑一致"""
+    soup = BeautifulSoup(content, 'html.parser')
+
+    title_div = soup.find('div', class_='vodInfo')
+    if title_div:
+        title = title_div.find('h2').get_text(strip=True)
+        poster_img_tag = soup.find('div', class_='vodImg').find('img')
+        poster_url = poster_img_tag['src'] if poster_img_tag else None
+    else:
+        title = "default_title"
+        poster_url = None
+
+    m3u8_links = []
+    for script in soup.find_all('script'):
+        if '.m3u8' in script.get_text():
+            for m3u8_url in M3U8_IN_SCRIPT_RE.findall(script.get_text()):
+                m3u8_links.append(('Episode', m3u8_url))
+
+    if not m3u8_links:
+        for tag in soup.find_all(['a', 'iframe', 'source']):
+            href = tag.get('href') or tag.get('src')
+            if href and '.m3u8' in href:
+                full_link = href if href.startswith('http') else urljoin(base_url, href)
+                episode_title = tag.get_text(strip=True) or "Episode"
+                m3u8_links.append((episode_title, full_link))
+
+    return title, poster_url, m3u8_links
+
+
+def extract_detail(content, base_url="https://huyazy.com"):
+    """返回 (标题, 封面地址, [(集标题, 链接), ...])，优先使用快速路径"""
+    result = fast_detail(content, base_url)
+    if result is not None:
+        STATS['fast'] += 1
+        return result
+    STATS['fallback'] += 1
+    return soup_detail(content, base_url)
+
+
+def extract_listing_entries(content, base_url="https://huyazy.com"):
+    """返回列表页中的 [(详情页地址, 条目摘要), ...]
+
+    摘要是链接所在条目（li 或父元素）的文字，例如标题加“更新至 12 集”，
+    列表页上的摘要变化说明节目有更新。同一节目的封面链接和标题链接只保留一条。
+    """
+    soup = BeautifulSoup(content, 'html.parser')
+    entries = {}
+    for link in soup.find_all('a', href=True):
+        href = link.get('href')
+        if not href.startswith('/index.php/vod/detail/id/'):
+            continue
+        item = link.find_parent('li') or link.parent
+        url = urljoin(base_url, href)
+        if url not in entries:
+            entries[url] = ' '.join(item.get_text(' ').split())
+    return list(entries.items())
@@ -0,0 +1,221 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+
+# 默认数据库位置
+FRONTIER_PATH = '.cache/frontier.sqlite'
+
+# 增量模式下连续多少个列表页没有新节目或变化时停止翻页
+STOP_AFTER_PAGES = 1
+
+# 单次运行最多翻的列表页数，翻到上限时保留进度，下一次运行接着翻
+MAX_PAGES = 1000
+
+# 详情页连续失败超过该次数后不再重试，直到它在列表页中再次变化
+MAX_ATTEMPTS = 5
+
+VOD_ID_RE = re.compile(r'/vod/detail/id/(\d+)')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    type_id INTEGER PRIMARY KEY,
+    started REAL NOT NULL,
+    next_page INTEGER NOT NULL,
+    full INTEGER NOT NULL,
+    paging_done INTEGER NOT NULL DEFAULT 0,
+    reached_end INTEGER NOT NULL DEFAULT 0,
+    unchanged_pages INTEGER NOT NULL DEFAULT 0,
+    checkpoint REAL,
+    finished REAL
+);
+CREATE TABLE IF NOT EXISTS vods (
+    type_id INTEGER NOT NULL,
+    vod_id INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    signature TEXT,
+    content_hash TEXT,
+    last_seen REAL,
+    fetched REAL,
+    pending INTEGER NOT NULL DEFAULT 1,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (type_id, vod_id)
+);
+CREATE INDEX IF NOT EXISTS vods_pending ON vods (type_id, pending);
+"""
+
+# 数据库结构版本，保存在 PRAGMA user_version 中
+SCHEMA_VERSION = 2
+
+# 版本 1 的 vods 表以 vod_id 为主键，同一个节目出现在第二个分类时插入失败；按 (type_id, vod_id) 重建并保留已有记录
+MIGRATE_V1 = """
+ALTER TABLE vods RENAME TO vods_v1;
+DROP INDEX IF EXISTS vods_pending;
+""" + SCHEMA + """
+INSERT INTO vods (type_id, vod_id, url, signature, content_hash, last_seen, fetched, pending, attempts)
+SELECT type_id, vod_id, url, signature, content_hash, last_seen, fetched, pending, attempts FROM vods_v1;
+DROP TABLE vods_v1;
+"""
+
+
+def vod_id_of(url):
+    match = VOD_ID_RE.search(url)
+    return int(match.group(1)) if match else None
+
+
+def content_hash(*parts):
+    """解析结果的哈希，用来判断详情页内容是否真的变化"""
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+class CrawlFrontier:
+    """保存在 SQLite 中的分类抓取进度
+
+    runs 表记录每个分类本次运行翻到第几页、是否已停止翻页；vods 表按分类记录每个节目
+    在列表页上的摘要（例如“更新至 12 集”）、详情页内容哈希和是否待抓取。
+    进程中途退出后，下一次运行从上次的页码继续，并先补抓未完成的详情页。
+    """
+
+    def __init__(self, path=FRONTIER_PATH):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self._migrate()
+        self.db.commit()
+
+    def _migrate(self):
+        """按 PRAGMA user_version 升级旧版本创建的数据库"""
+        if self.db.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            return
+        keys = [row[1] for row in self.db.execute("PRAGMA table_info(vods)") if row[5]]
+        if keys == ['vod_id']:
+            self.db.executescript(f"BEGIN; {MIGRATE_V1} PRAGMA user_version = {SCHEMA_VERSION}; COMMIT;")
+            print(f"进度库已升级到版本 {SCHEMA_VERSION}: {self.path}")
+        else:
+            self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def begin(self, type_id, full=False):
+        """开始或继续一个分类的运行，返回 (起始页码, 是否完整翻页)
+
+        分类第一次抓取、或显式要求时完整翻页；否则遇到连续未变化的页就停止。
+        """
+        with self.lock:
+            row = self.db.execute("SELECT next_page, full, finished, started, checkpoint FROM runs "
+                                  "WHERE type_id = ?", (type_id,)).fetchone()
+            if row is not None and row[2] is None:
+                # 上一次运行未结束（中途退出或列表页抓取失败），从中断的页码继续；
+                # 进程被强行终止时播放列表清单没有保存，上次正常退出之后抓取的详情页重新抓一次
+                full = bool(row[1] or full)
+                self.db.execute("UPDATE runs SET full = ? WHERE type_id = ?", (int(full), type_id))
+                self.db.execute("UPDATE vods SET pending = 1 WHERE type_id = ? AND fetched >= ?",
+                                (type_id, row[4] or row[3]))
+                self.db.commit()
+                return row[0], full
+            first_run = row is None
+            full = full or first_run
+            self.db.execute("INSERT OR REPLACE INTO runs (type_id, started, next_page, full) VALUES (?, ?, 1, ?)",
+                            (type_id, time.time(), int(full)))
+            self.db.commit()
+            return 1, full
+
+    def paging_done(self, type_id):
+        with self.lock:
+            row = self.db.execute("SELECT paging_done FROM runs WHERE type_id = ?", (type_id,)).fetchone()
+            return bool(row and row[0])
+
+    def record_listing(self, type_id, page, entries, stop_after=STOP_AFTER_PAGES):
+        """记录一个列表页，entries 为 [(详情页地址, 列表摘要)]
+
+        新节目和摘要变化的节目标记为待抓取。返回 (待抓取的 [(vod_id, 地址)], 是否继续翻页)。
+        """
+        now = time.time()
+        queued = []
+        with self.lock:
+            for url, signature in entries:
+                vod_id = vod_id_of(url)
+                if vod_id is None:
+                    continue
+                row = self.db.execute("SELECT signature, pending, content_hash FROM vods "
+                                      "WHERE type_id = ? AND vod_id = ?", (type_id, vod_id)).fetchone()
+                if row is None:
+                    self.db.execute("INSERT INTO vods (vod_id, type_id, url, signature, last_seen, pending) "
+                                    "VALUES (?, ?, ?, ?, ?, 1)", (vod_id, type_id, url, signature, now))
+                    queued.append((vod_id, url))
+                elif row[0] != signature or row[2] is None:
+                    self.db.execute("UPDATE vods SET url = ?, signature = ?, last_seen = ?, pending = 1, "
+                                    "attempts = 0 WHERE type_id = ? AND vod_id = ?",
+                                    (url, signature, now, type_id, vod_id))
+                    queued.append((vod_id, url))
+                else:
+                    self.db.execute("UPDATE vods SET url = ?, last_seen = ? WHERE type_id = ? AND vod_id = ?",
+                                    (url, now, type_id, vod_id))
+
+            full, unchanged = self.db.execute("SELECT full, unchanged_pages FROM runs WHERE type_id = ?",
+                                              (type_id,)).fetchone()
+            unchanged = 0 if queued else unchanged + 1
+            reached_end = not entries
+            stop = reached_end or (not full and unchanged >= stop_after)
+            self.db.execute("UPDATE runs SET next_page = ?, unchanged_pages = ?, paging_done = ?, "
+                            "reached_end = ? WHERE type_id = ?",
+                            (page + 1, unchanged, int(stop), int(reached_end), type_id))
+            self.db.commit()
+        return queued, not stop
+
+    def pending(self, type_id):
+        """待抓取（含上次中断遗留）的 [(vod_id, 地址)]"""
+        with self.lock:
+            return self.db.execute("SELECT vod_id, url FROM vods WHERE type_id = ? AND pending = 1 "
+                                   "AND attempts < ? ORDER BY last_seen DESC",
+                                   (type_id, MAX_ATTEMPTS)).fetchall()
+
+    def record_detail(self, type_id, vod_id, digest):
+        """详情页抓取成功，返回内容是否与上次不同"""
+        with self.lock:
+            row = self.db.execute("SELECT content_hash FROM vods WHERE type_id = ? AND vod_id = ?",
+                                  (type_id, vod_id)).fetchone()
+            self.db.execute("UPDATE vods SET content_hash = ?, fetched = ?, pending = 0, attempts = 0 "
+                            "WHERE type_id = ? AND vod_id = ?", (digest, time.time(), type_id, vod_id))
+            self.db.commit()
+            return row is None or row[0] != digest
+
+    def fail_detail(self, type_id, vod_id):
+        """详情页抓取失败，保留待抓取状态，下次运行重试"""
+        with self.lock:
+            self.db.execute("UPDATE vods SET attempts = attempts + 1 WHERE type_id = ? AND vod_id = ?",
+                            (type_id, vod_id))
+            self.db.commit()
+
+    def finish(self, type_id):
+        """结束本次运行，返回 (是否完整翻到最后一页, 本次运行中列表页出现过的详情页地址)
+
+        调用方随后应保存播放列表清单。翻页没有正常停止（列表页抓取失败或达到单次页数上限）时运行保持未结束，下一次从失败的页码继续。
+        只有完整翻页时地址集合才是完整的分类目录，可以用来清理下架节目。
+        """
+        with self.lock:
+            started, full, paging_done, reached_end = self.db.execute(
+                "SELECT started, full, paging_done, reached_end FROM runs WHERE type_id = ?",
+                (type_id,)).fetchone()
+            now = time.time()
+            self.db.execute("UPDATE runs SET checkpoint = ?, finished = ? WHERE type_id = ?",
+                            (now, now if paging_done else None, type_id))
+            self.db.commit()
+            complete = bool(full and paging_done and reached_end)
+            urls = {url for (url,) in self.db.execute(
+                "SELECT url FROM vods WHERE type_id = ? AND last_seen >= ?", (type_id, started))}
+            return complete, urls
+
+    def stats(self, type_id):
+        with self.lock:
+            total, pending = self.db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(pending), 0) FROM vods WHERE type_id = ?", (type_id,)).fetchone()
+            return {'vods': total, 'pending': pending}
+
+    def close(self):
+        with self.lock:
+            self.db.close()
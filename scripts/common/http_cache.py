@@ -0,0 +1,161 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import tempfile
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# 缓存索引格式版本，解析结果的结构变化时需要递增
+CACHE_VERSION = 1
+
+# 默认淘汰策略：最长保留 7 天，总大小不超过 200 MB
+DEFAULT_MAX_AGE = 7 * 24 * 3600
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+# 生成缓存键时忽略的查询参数（防缓存用的随机参数）
+IGNORED_QUERY_KEYS = {'t', '_'}
+
+
+def canonical_url(url):
+    """规范化 URL：小写协议和主机、去掉片段和随机参数、查询参数排序"""
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+             if k not in IGNORED_QUERY_KEYS]
+    query.sort()
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or '/',
+                       urlencode(query), ''))
+
+
+class ResponseCache:
+    """基于 ETag / Last-Modified 的磁盘响应缓存
+
+    索引保存在 index.json 中，响应正文按 URL 哈希存放在 bodies/ 目录下。
+    每条记录还可以附带解析结果，收到 304 时直接复用，无需再次解析。
+    """
+
+    def __init__(self, cache_dir, max_age=DEFAULT_MAX_AGE, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.body_dir = os.path.join(cache_dir, 'bodies')
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.body_dir, exist_ok=True)
+        self.entries = self._load_index()
+
+    def _load_index(self):
+        """读取索引文件，格式不符时视为空缓存"""
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get('version') != CACHE_VERSION:
+            return {}
+        return data.get('entries', {})
+
+    def _key(self, url):
+        return hashlib.sha1(canonical_url(url).encode('utf-8')).hexdigest()
+
+    def _body_path(self, key):
+        return os.path.join(self.body_dir, key)
+
+    def get(self, url):
+        """返回 URL 对应的缓存记录，不存在时返回 None"""
+        with self.lock:
+            return self.entries.get(self._key(url))
+
+    def conditional_headers(self, entry):
+        """根据缓存记录生成条件请求头"""
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def load_body(self, entry):
+        """读取缓存的响应正文，文件丢失时返回 None"""
+        try:
+            with open(self._body_path(entry['key']), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def store(self, url, body, etag=None, last_modified=None, parsed=None):
+        """保存响应正文和校验信息；服务器没有返回任何校验字段时不缓存"""
+        if not etag and not last_modified:
+            return
+        key = self._key(url)
+        fd, tmp_path = tempfile.mkstemp(dir=self.body_dir)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, self._body_path(key))
+
+        now = time.time()
+        with self.lock:
+            self.entries[key] = {
+                'key': key,
+                'url': canonical_url(url),
+                'etag': etag,
+                'last_modified': last_modified,
+                'size': len(body),
+                'stored_at': now,
+                'last_used': now,
+                'parsed': parsed,
+            }
+
+    def record(self, hit):
+        """记录一次查找的结果：收到 304 并复用了缓存内容为命中；
+        没有缓存、内容有变化、缓存正文丢失或请求失败都算未命中"""
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def revalidated(self, url):
+        """服务器返回 304 时刷新记录的时间戳"""
+        with self.lock:
+            entry = self.entries.get(self._key(url))
+            if entry:
+                now = time.time()
+                entry['stored_at'] = now
+                entry['last_used'] = now
+            return entry
+
+    def evict(self):
+        """先删除过期记录，再按最近使用时间淘汰直到总大小不超过上限"""
+        now = time.time()
+        with self.lock:
+            expired = [k for k, e in self.entries.items() if now - e['stored_at'] > self.max_age]
+            for key in expired:
+                self._remove(key)
+
+            total = sum(e['size'] for e in self.entries.values())
+            for entry in sorted(self.entries.values(), key=lambda e: e['last_used']):
+                if total <= self.max_bytes:
+                    break
+                total -= entry['size']
+                self._remove(entry['key'])
+            return len(expired)
+
+    def _remove(self, key):
+        self.entries.pop(key, None)
+        try:
+            os.remove(self._body_path(key))
+        except OSError:
+            pass
+
+    def save(self):
+        """原子地写回索引文件"""
+        with self.lock:
+            data = {'version': CACHE_VERSION, 'entries': self.entries}
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
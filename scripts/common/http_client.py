@@ -0,0 +1,310 @@
+import time
+import asyncio
+import threading
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from common.rate_limit import RETRY_STATUS, backoff_delay, retry_after_seconds
+
+# 所有脚本共用的请求头
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
+DEFAULT_HEADERS = {'User-Agent': USER_AGENT}
+
+# 默认超时（连接, 读取），单位秒
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 30
+DEFAULT_TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+# 每个主机保持的长连接数、最多保留连接池的主机数
+POOL_SIZE = 10
+POOL_HOSTS = 32
+
+# 连接错误或 429/5xx 时的默认重试次数（不含第一次请求）
+RETRIES = 2
+
+# 保留用于计算分位数的最近延迟样本数
+LATENCY_SAMPLES = 10000
+
+
+class ClientStats:
+    """线程安全的请求计数：请求数、重试、失败、字节数、新建连接数和延迟"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+        self.bytes = 0
+        self.connections = 0
+        # 只保留最近的样本，满了以后自动丢弃最早的
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def record(self, latency, nbytes=0):
+        with self.lock:
+            self.requests += 1
+            self.bytes += nbytes
+            self.latencies.append(latency)
+
+    def count(self, key, amount=1):
+        with self.lock:
+            setattr(self, key, getattr(self, key) + amount)
+
+    @property
+    def reuse_rate(self):
+        """复用已有连接的请求占比"""
+        if not self.requests:
+            return 0.0
+        return max(0.0, 1 - self.connections / self.requests)
+
+    def percentile(self, fraction):
+        with self.lock:
+            samples = sorted(self.latencies)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+    def as_dict(self):
+        p50, p95, p99 = self.percentile(0.5), self.percentile(0.95), self.percentile(0.99)
+        return {
+            'requests': self.requests, 'retries': self.retries, 'errors': self.errors,
+            'bytes': self.bytes, 'connections': self.connections,
+            'reuse_rate': round(self.reuse_rate, 3),
+            'p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+            'p95_ms': round(p95 * 1000, 1) if p95 is not None else None,
+            'p99_ms': round(p99 * 1000, 1) if p99 is not None else None,
+        }
+
+    def summary(self):
+        stats = self.as_dict()
+        return (f"HTTP: 请求 {stats['requests']} 次（重试 {stats['retries']}，失败 {stats['errors']}），"
+                f"新建连接 {stats['connections']} 个，复用率 {stats['reuse_rate']:.0%}，"
+                f"下载 {stats['bytes'] / 1024:.0f} KB，延迟 p50 {stats['p50_ms']} ms / p95 {stats['p95_ms']} ms")
+
+
+def counting_pool_class(pool_class, stats):
+    """返回一个连接池子类，其连接每次真正建立 TCP 连接时计数一次（包括断线重连）"""
+    base = pool_class.ConnectionCls
+
+    def connect(conn):
+        stats.count('connections')
+        return base.connect(conn)
+
+    connection_class = type(base.__name__, (base,), {'connect': connect})
+    return type(pool_class.__name__, (pool_class,), {'ConnectionCls': connection_class})
+
+
+class CountingAdapter(HTTPAdapter):
+    """记录每次请求的首字节延迟、正文大小和新建连接数
+
+    非流式响应在这里读完正文（requests 随后也会读取），流式响应按 Content-Length 估算。
+    """
+
+    def __init__(self, stats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        classes = self.poolmanager.pool_classes_by_scheme
+        self.poolmanager.pool_classes_by_scheme = {
+            scheme: counting_pool_class(pool_class, self.stats) for scheme, pool_class in classes.items()}
+
+    def send(self, request, stream=False, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = super().send(request, stream=stream, **kwargs)
+        except requests.RequestException:
+            self.stats.count('errors')
+            raise
+        latency = time.perf_counter() - start
+        if stream:
+            nbytes = int(response.headers.get('Content-Length') or 0)
+        else:
+            nbytes = len(response.content)
+        self.stats.record(latency, nbytes)
+        return response
+
+
+class PooledSession(requests.Session):
+    """带长连接池、默认超时、默认请求头和计数的会话"""
+
+    def __init__(self, pool_size=POOL_SIZE, timeout=DEFAULT_TIMEOUT, headers=None, stats=None):
+        super().__init__()
+        self.timeout = timeout
+        self.stats = stats or ClientStats()
+        self.headers.update(DEFAULT_HEADERS)
+        if headers:
+            self.headers.update(headers)
+        self.adapter = CountingAdapter(self.stats, pool_connections=POOL_HOSTS, pool_maxsize=pool_size)
+        self.mount('http://', self.adapter)
+        self.mount('https://', self.adapter)
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().request(method, url, **kwargs)
+
+    def summary(self):
+        return self.stats.summary()
+
+
+# 按统一策略发送请求：连接错误和 429/5xx 时按 Retry-After 或指数退避重试
+def request(session, method, url, retries=RETRIES, limiter=None, **kwargs):
+    """返回最后一次的响应（不检查状态码）；连接错误重试用尽时抛出异常
+
+    limiter 为 OriginRateLimiter 时每次请求前取令牌，429/5xx 时降速，成功时逐步恢复。
+    """
+    stats = getattr(session, 'stats', None)
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            limiter.acquire(url)
+        delay = None
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt >= retries:
+                raise
+            reason = e
+        else:
+            if response.status_code not in RETRY_STATUS:
+                if limiter is not None:
+                    limiter.reward(url)
+                return response
+            if limiter is not None:
+                limiter.penalize(url)
+            if attempt >= retries:
+                return response
+            delay = retry_after_seconds(response.headers)
+            reason = f"HTTP {response.status_code}"
+            response.close()
+        if delay is None:
+            delay = backoff_delay(attempt)
+        if stats is not None:
+            stats.count('retries')
+        print(f"请求失败 (尝试 {attempt + 1}/{retries + 1}): {url} {reason}，等待 {delay:.2f} 秒后重试...")
+        time.sleep(delay)
+
+
+def get(session, url, retries=RETRIES, limiter=None, **kwargs):
+    return request(session, 'GET', url, retries, limiter, **kwargs)
+
+
+# request() 的异步版本，重试条件和退避策略相同
+async def request_async(session, method, url, retries=RETRIES, limiter=None, **kwargs):
+    """返回最后一次的响应（不检查状态码）；连接错误和超时重试用尽时抛出异常
+
+    返回前已读完正文并把连接还给连接池，调用方随后 await response.read() 直接拿到缓存的正文。
+    只读取部分正文的流式请求（例如 m3u8 样本下载）不要用它。
+    limiter 的用法与 request() 相同，等待令牌时不阻塞事件循环。
+    """
+    import aiohttp
+
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            wait = limiter.reserve(url)
+            if wait:
+                await asyncio.sleep(wait)
+        delay = None
+        try:
+            # 重试次数通过 trace_request_ctx 传给 make_trace_config() 计数
+            response = await session.request(method, url, trace_request_ctx={'attempt': attempt}, **kwargs)
+            # 读完正文后连接自动归还；读取失败时 aiohttp 会关闭连接
+            await response.read()
+        except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+            if attempt >= retries:
+                raise
+            reason = repr(e)
+        else:
+            if response.status not in RETRY_STATUS:
+                if limiter is not None:
+                    limiter.reward(url)
+                return response
+            if limiter is not None:
+                limiter.penalize(url)
+            if attempt >= retries:
+                return response
+            delay = retry_after_seconds(response.headers)
+            reason = f"HTTP {response.status}"
+        if delay is None:
+            delay = backoff_delay(attempt)
+        print(f"请求失败 (尝试 {attempt + 1}/{retries + 1}): {url} {reason}，等待 {delay:.2f} 秒后重试...")
+        await asyncio.sleep(delay)
+
+
+async def get_async(session, url, retries=RETRIES, limiter=None, **kwargs):
+    return await request_async(session, 'GET', url, retries, limiter, **kwargs)
+
+
+# 异步会话：aiohttp 只有异步脚本需要，按需导入
+def make_async_session(limit=100, per_host=POOL_SIZE, connect_timeout=CONNECT_TIMEOUT,
+                       timeout=READ_TIMEOUT, headers=None, stats=None, verify_ssl=True):
+    """创建带长连接池和超时的 aiohttp.ClientSession；传入 ClientStats 时通过 TraceConfig 计数"""
+    import aiohttp
+
+    trace_configs = []
+    if stats is not None:
+        trace_configs.append(make_trace_config(stats))
+
+    connector = aiohttp.TCPConnector(limit=limit, limit_per_host=per_host, ttl_dns_cache=600,
+                                     ssl=None if verify_ssl else False)
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=timeout, sock_connect=connect_timeout),
+        headers={**DEFAULT_HEADERS, **(headers or {})},
+        trace_configs=trace_configs,
+    )
+
+
+def make_trace_config(stats):
+    """把请求数、延迟、新建连接数和下载字节数记入 stats 的 TraceConfig
+
+    延迟从开始建立或复用连接时计时，不含在连接池中排队的时间，但包含新建连接的
+    DNS、TCP 和 TLS 握手耗时，与同步的 CountingAdapter 一致；
+    字节数只统计通过 read()/text()/json() 读取的正文。
+    """
+    import aiohttp
+
+    trace = aiohttp.TraceConfig()
+
+    async def on_request_start(session, context, params):
+        context.start = time.perf_counter()
+        context.queued = False
+        if (context.trace_request_ctx or {}).get('attempt'):
+            stats.count('retries')
+
+    async def on_request_end(session, context, params):
+        stats.record(time.perf_counter() - context.start)
+
+    async def on_request_exception(session, context, params):
+        stats.count('errors')
+
+    # 在连接池中排队时从排队结束计时，否则从开始新建或复用连接计时
+    async def on_connection_queued_end(session, context, params):
+        context.start = time.perf_counter()
+        context.queued = True
+
+    async def on_connection_create_start(session, context, params):
+        if not context.queued:
+            context.start = time.perf_counter()
+
+    async def on_connection_create_end(session, context, params):
+        stats.count('connections')
+
+    async def on_connection_reuseconn(session, context, params):
+        if not context.queued:
+            context.start = time.perf_counter()
+
+    async def on_response_chunk_received(session, context, params):
+        stats.count('bytes', len(params.chunk))
+
+    trace.on_request_start.append(on_request_start)
+    trace.on_request_end.append(on_request_end)
+    trace.on_request_exception.append(on_request_exception)
+    trace.on_connection_queued_end.append(on_connection_queued_end)
+    trace.on_connection_create_start.append(on_connection_create_start)
+    trace.on_connection_create_end.append(on_connection_create_end)
+    trace.on_connection_reuseconn.append(on_connection_reuseconn)
+    trace.on_response_chunk_received.append(on_response_chunk_received)
+    return trace
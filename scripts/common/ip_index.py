@@ -0,0 +1,224 @@
+# 离线 IP 段索引：按起始地址排序的整数数组，用 bisect 查找地址所属的网段和归属
+#
+# 查看列表中各归属的地址数：
+#     python scripts/common/ip_index.py tag scripts/bbb/ip.txt scripts/ddd/ip.txt
+# 从 Cloudflare 和 Oracle 的官方列表重新生成数据文件：
+#     python scripts/common/ip_index.py update
+import os
+import sys
+import socket
+import argparse
+import tempfile
+import ipaddress
+from array import array
+from bisect import bisect_right
+
+# 默认数据文件，每行 "CIDR ASN 归属"
+RANGES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'ip_ranges.txt')
+
+# 不在任何已知网段内的地址记为该归属，并按下面的前缀长度归入同一网段
+UNKNOWN_OWNER = 'unknown'
+UNKNOWN_PREFIX_V4 = 24
+UNKNOWN_PREFIX_V6 = 48
+
+# update 命令使用的官方列表
+CLOUDFLARE_URLS = ['https://www.cloudflare.com/ips-v4', 'https://www.cloudflare.com/ips-v6']
+ORACLE_URL = 'https://docs.oracle.com/en-us/iaas/tools/public_ip_ranges.json'
+
+
+def read_ranges(path=RANGES_PATH):
+    """读取数据文件，返回 [(CIDR, ASN, 归属)]，格式不正确的行跳过"""
+    ranges = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            fields = line.split('#')[0].split()
+            if len(fields) == 3:
+                ranges.append(tuple(fields))
+    return ranges
+
+
+def address_value(host):
+    """把 IP 地址转换为 (地址族, 整数)，不是 IP 地址时返回 (None, None)"""
+    try:
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, host), 'big')
+    except OSError:
+        pass
+    try:
+        return 6, int.from_bytes(socket.inet_pton(socket.AF_INET6, host), 'big')
+    except OSError:
+        return None, None
+
+
+class IpRangeIndex:
+    """IPv4 / IPv6 网段索引
+
+    每个地址族各一组按起始地址排序的数组：起始、结束、上级网段下标和标签下标
+    （IPv4 用 array 保存，IPv6 超出 64 位只能用列表）。CIDR 之间要么不相交要么互相包含，
+    查找时先用 bisect 找到起始地址不大于目标的最后一个网段，不包含目标时沿上级网段回退，
+    因此总是返回最具体的匹配。
+    """
+
+    def __init__(self, ranges=()):
+        self.labels = []
+        entries = {4: [], 6: []}
+        for cidr, asn, owner in ranges:
+            try:
+                network = ipaddress.ip_network(cidr, strict=False)
+            except ValueError:
+                continue
+            entries[network.version].append((int(network.network_address), network.prefixlen,
+                                             int(network.broadcast_address), len(self.labels)))
+            self.labels.append((str(network), asn, owner))
+        self.tables = {4: self._build(entries[4], 'I'), 6: self._build(entries[6], None)}
+
+    @classmethod
+    def load(cls, path=RANGES_PATH):
+        return cls(read_ranges(path))
+
+    @staticmethod
+    def _build(entries, typecode):
+        # 同一起始地址时范围大的在前，成为后面小网段的上级
+        entries.sort()
+        starts, ends, parents, labels = [], [], [], []
+        stack = []
+        for start, _, end, label in entries:
+            while stack and ends[stack[-1]] < start:
+                stack.pop()
+            parents.append(stack[-1] if stack else -1)
+            stack.append(len(starts))
+            starts.append(start)
+            ends.append(end)
+            labels.append(label)
+        if typecode is None:
+            return starts, ends, parents, labels
+        return array(typecode, starts), array(typecode, ends), array('i', parents), array('i', labels)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def _find(self, version, value):
+        starts, ends, parents, labels = self.tables[version]
+        i = bisect_right(starts, value) - 1
+        while i >= 0 and ends[i] < value:
+            i = parents[i]
+        return self.labels[labels[i]] if i >= 0 else None
+
+    def lookup(self, host):
+        """返回 (网段, ASN, 归属)，不在任何网段内或不是 IP 地址时返回 None"""
+        version, value = address_value(host)
+        if version is None:
+            return None
+        return self._find(version, value)
+
+    def tag(self, host):
+        """返回 (网段, 归属)；未知地址按 /24（IPv6 为 /48）归入网段，域名以自身为网段"""
+        version, value = address_value(host)
+        if version is None:
+            return host, UNKNOWN_OWNER
+        label = self._find(version, value)
+        if label is not None:
+            return label[0], label[2]
+        if version == 4:
+            shift = 32 - UNKNOWN_PREFIX_V4
+            address = socket.inet_ntoa((value >> shift << shift).to_bytes(4, 'big'))
+            return f"{address}/{UNKNOWN_PREFIX_V4}", UNKNOWN_OWNER
+        shift = 128 - UNKNOWN_PREFIX_V6
+        return str(ipaddress.ip_network((value >> shift << shift, UNKNOWN_PREFIX_V6))), UNKNOWN_OWNER
+
+
+def prefilter(items, index, owners=None, exclude=None, per_network=0):
+    """探测之前按归属过滤，并限制每个网段的数量
+
+    items 为 [(键, 主机)]，应已按优先级排好序，每个网段保留最前面的 per_network 个（0 为不限制）。
+    owners 不为空时只保留这些归属，exclude 中的归属全部丢弃。
+    返回 (保留的键, {归属: [总数, 保留数]})
+    """
+    kept = []
+    per_owner = {}
+    per_net = {}
+    for key, host in items:
+        network, owner = index.tag(host)
+        counts = per_owner.setdefault(owner, [0, 0])
+        counts[0] += 1
+        if owners and owner not in owners:
+            continue
+        if exclude and owner in exclude:
+            continue
+        if per_network > 0:
+            if per_net.get(network, 0) >= per_network:
+                continue
+            per_net[network] = per_net.get(network, 0) + 1
+        counts[1] += 1
+        kept.append(key)
+    return kept, per_owner
+
+
+def format_owner_counts(per_owner):
+    return '，'.join(f"{owner} {kept}/{total}" for owner, (total, kept) in
+                    sorted(per_owner.items(), key=lambda item: -item[1][0]))
+
+
+def tag_command(args):
+    # 作为脚本运行时 common 包在 main() 中才加入搜索路径
+    from common.tcp_scan import parse_endpoint
+
+    index = IpRangeIndex.load(args.ranges)
+    for path in args.files:
+        items = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                endpoint = parse_endpoint(line, default_port=443)
+                if endpoint is not None:
+                    items.append((line.strip(), endpoint[0]))
+        _, per_owner = prefilter(items, index)
+        print(f"{path}: {len(items)} 个地址，{format_owner_counts(per_owner)}")
+        if args.verbose:
+            for line, host in items:
+                network, owner = index.tag(host)
+                print(f"  {line}  {owner} {network}")
+    return 0
+
+
+def update_command(args):
+    from common.http_client import PooledSession, get
+
+    lines = ["# 离线 IP 段数据：每行 \"CIDR ASN 归属\"，# 开头为注释",
+             "# 由 python scripts/common/ip_index.py update 重新生成，也可以手工追加", ""]
+    with PooledSession() as session:
+        lines.append(f"# Cloudflare（{' 和 '.join(CLOUDFLARE_URLS)}）")
+        for url in CLOUDFLARE_URLS:
+            response = get(session, url)
+            response.raise_for_status()
+            lines.extend(f"{cidr} AS13335 cloudflare" for cidr in response.text.split())
+        response = get(session, ORACLE_URL)
+        response.raise_for_status()
+        lines.append(f"\n# Oracle Cloud（{ORACLE_URL}）")
+        cidrs = sorted({entry['cidr'] for region in response.json().get('regions', [])
+                        for entry in region.get('cidrs', [])})
+        lines.extend(f"{cidr} AS31898 oracle" for cidr in cidrs)
+
+    folder = os.path.dirname(args.ranges) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=folder)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, args.ranges)
+    print(f"已写入 {args.ranges}，共 {len(IpRangeIndex.load(args.ranges))} 个网段")
+    return 0
+
+
+def main():
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    parser = argparse.ArgumentParser(description="离线 IP 段索引工具")
+    parser.add_argument('--ranges', default=RANGES_PATH, help="IP 段数据文件")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_tag = sub.add_parser('tag', help="统计列表文件中各归属的地址数")
+    p_tag.add_argument('files', nargs='+', help="IP 列表文件")
+    p_tag.add_argument('--verbose', action='store_true', help="逐行列出归属和网段")
+    sub.add_parser('update', help="从 Cloudflare 和 Oracle 的官方列表重新生成数据文件")
+    args = parser.parse_args()
+    commands = {'tag': tag_command, 'update': update_command}
+    sys.exit(commands[args.command](args))
+
+
+if __name__ == "__main__":
+    main()
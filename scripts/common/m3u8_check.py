@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import asyncio
+import tempfile
+from urllib.parse import urljoin, urlsplit
+
+import aiohttp
+
+# 每个片段最多读取的字节数，用于估算吞吐量
+SAMPLE_BYTES = 256 * 1024
+
+# 单个播放列表检查的超时（秒）和每个主机的并发检查数
+CHECK_TIMEOUT = 15
+PER_HOST_CHECKS = 4
+
+# 检查结果缓存：结果在 CHECK_TTL 秒内直接复用，超过 EXPIRE_DAYS 天没有检查的链接从文件中删除
+CHECKS_PATH = '.cache/m3u8_checks.json'
+CHECK_TTL = 24 * 3600
+EXPIRE_DAYS = 30
+
+# 连续多少次运行检查失败才去掉该链接，偶尔一次超时不会让剧集消失
+DEAD_AFTER = 2
+
+# 镜像耗时的 EWMA 平滑系数，以及最快的镜像比页面上的第一个快多少倍以上才移到最前
+COST_ALPHA = 0.3
+REORDER_RATIO = 2.0
+
+
+def first_uri(playlist_text, base_url):
+    """返回播放列表中第一条非注释 URI（绝对地址），没有时返回 None"""
+    for line in playlist_text.splitlines():
+        line = line.strip()
+        if line and not line.startswith('#'):
+            return urljoin(base_url, line)
+    return None
+
+
+async def fetch_playlist(session, url):
+    async with session.get(url) as response:
+        response.raise_for_status()
+        return await response.text(errors='replace')
+
+
+async def check_playlist(session, url, sample_bytes=SAMPLE_BYTES):
+    """检查一条 m3u8 链接：解析（必要时跟随主播放列表）后读取第一个片段
+
+    返回 {'alive', 'ttfb', 'throughput', 'cost'}，cost 为下载样本的预计总耗时（秒），越小越好。
+    """
+    text = await fetch_playlist(session, url)
+    if '#EXT-X-STREAM-INF' in text:
+        url = first_uri(text, url)
+        if url is None:
+            return {'alive': False}
+        text = await fetch_playlist(session, url)
+
+    segment = first_uri(text, url)
+    if segment is None:
+        return {'alive': False}
+
+    start = time.perf_counter()
+    async with session.get(segment) as response:
+        response.raise_for_status()
+        received = 0
+        ttfb = None
+        async for chunk in response.content.iter_chunked(16 * 1024):
+            if ttfb is None:
+                ttfb = time.perf_counter() - start
+            received += len(chunk)
+            if received >= sample_bytes:
+                break
+    if not received:
+        return {'alive': False}
+
+    elapsed = time.perf_counter() - start
+    transfer = max(elapsed - ttfb, 1e-6)
+    throughput = received / transfer
+    return {'alive': True, 'ttfb': ttfb, 'throughput': throughput,
+            'cost': ttfb + sample_bytes / throughput}
+
+
+class M3U8Validator:
+    """并发检查剧集链接，按主机限制并发数
+
+    每条链接的检查结果（平滑后的耗时和连续失败次数）保存在 path 中，跨运行复用：
+    CHECK_TTL 内检查过的链接不再下载样本，调用方结束时应调用 save()。
+    """
+
+    def __init__(self, session, per_host=PER_HOST_CHECKS, timeout=CHECK_TIMEOUT, retries=1,
+                 path=CHECKS_PATH, ttl=CHECK_TTL):
+        self.session = session
+        self.per_host = per_host
+        self.timeout = timeout
+        self.retries = retries
+        self.path = path
+        self.ttl = ttl
+        self.semaphores = {}
+        self.stats = {'checked': 0, 'alive': 0, 'dead': 0, 'cached': 0}
+        self.results = {}
+        if path:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.results = json.load(f)
+            except (OSError, ValueError):
+                self.results = {}
+
+    def semaphore(self, url):
+        host = urlsplit(url).netloc.lower()
+        if host not in self.semaphores:
+            self.semaphores[host] = asyncio.Semaphore(self.per_host)
+        return self.semaphores[host]
+
+    async def check(self, url):
+        result = {'alive': False}
+        for _ in range(self.retries + 1):
+            async with self.semaphore(url):
+                try:
+                    result = await asyncio.wait_for(check_playlist(self.session, url), self.timeout)
+                except (aiohttp.ClientError, asyncio.TimeoutError, UnicodeError):
+                    result = {'alive': False}
+            if result['alive']:
+                break
+        self.stats['checked'] += 1
+        self.stats['alive' if result['alive'] else 'dead'] += 1
+        return result
+
+    def record(self, url, result, now):
+        """把一次检查结果并入缓存：耗时取 EWMA，失败只累加连续失败次数"""
+        entry = self.results.setdefault(url, {'cost': None, 'failures': 0})
+        if result['alive']:
+            if entry['cost'] is None:
+                entry['cost'] = result['cost']
+            else:
+                entry['cost'] += COST_ALPHA * (result['cost'] - entry['cost'])
+            entry['failures'] = 0
+        else:
+            entry['failures'] += 1
+        entry['checked'] = now
+
+    def usable(self, url):
+        """没有检查过或连续失败次数未到 DEAD_AFTER 的链接都保留"""
+        entry = self.results.get(url)
+        return entry is None or entry['failures'] < DEAD_AFTER
+
+    def cost(self, url):
+        return (self.results.get(url) or {}).get('cost')
+
+    def order(self, mirrors):
+        """镜像排序：最快的镜像比页面上的第一个快 REORDER_RATIO 倍以上时移到最前，其余保持页面顺序
+
+        只比较第一个和最快的一个，不用按比例阈值两两比较（那样的比较不可传递，
+        三个以上镜像时排序结果会随输入顺序变化）。第一个镜像没有耗时记录时不调整。
+        """
+        first = self.cost(mirrors[0][1])
+        timed = [mirror for mirror in mirrors if self.cost(mirror[1]) is not None]
+        if first is None or not timed:
+            return mirrors
+        fastest = min(timed, key=lambda mirror: self.cost(mirror[1]))
+        if self.cost(fastest[1]) * REORDER_RATIO < first:
+            return [fastest] + [mirror for mirror in mirrors if mirror is not fastest]
+        return mirrors
+
+    async def validate(self, m3u8_links, recheck=True):
+        """去掉确认失效的剧集；同一集有多个镜像时按平滑后的耗时调整顺序（见 order()）
+
+        目前的详情页只有 #play_2 一组 m3u8 来源（#play_1 是分享页），每集只有一个链接，
+        镜像排序实际不起作用，保留给同一集有多个 m3u8 来源的页面。
+
+        recheck 为 False 时（节目详情页未变化）完全不发请求，只按缓存的结果排序，
+        缓存过期也不重新检查。如果本次检查的链接全部失败，更可能是本机网络问题，
+        此时不记录结果并原样返回。
+        """
+        now = time.time()
+        links = list(dict.fromkeys(link for _, link in m3u8_links))
+        stale = []
+        if recheck:
+            stale = [link for link in links
+                     if now - self.results.get(link, {}).get('checked', 0) >= self.ttl]
+        self.stats['cached'] += len(links) - len(stale)
+        if stale:
+            results = await asyncio.gather(*(self.check(link) for link in stale))
+            if not any(result['alive'] for result in results):
+                return list(m3u8_links)
+            for link, result in zip(stale, results):
+                self.record(link, result, now)
+
+        # 按 $ 前的集标题分组，保持剧集首次出现的顺序
+        episodes = {}
+        for episode_title, link in m3u8_links:
+            if self.usable(link):
+                episodes.setdefault(episode_title.split('$')[0], []).append((episode_title, link))
+        if not episodes:
+            return list(m3u8_links)
+
+        validated = []
+        for mirrors in episodes.values():
+            validated.extend(self.order(mirrors))
+        return validated
+
+    def save(self):
+        """删除长期没有检查的链接后原子地写回"""
+        if not self.path:
+            return
+        cutoff = time.time() - EXPIRE_DAYS * 86400
+        self.results = {k: v for k, v in self.results.items() if v.get('checked', 0) >= cutoff}
+        folder = os.path.dirname(self.path) or '.'
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=folder)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(self.results, f, sort_keys=True)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,136 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+
+from common.playlist_store import atomic_write, render_m3u, safe_name
+
+# 索引文件名
+INDEX_NAME = 'index.json'
+
+
+class PackedOutput:
+    """每个节目一个合并播放列表，外加 JSON 索引，整棵目录树构建完成后一次切换
+
+    目标路径（例如 综艺）是一个符号链接，指向 .综艺.versions/ 下的某个版本目录。
+    每次运行在新的版本目录中构建，commit() 时用 os.replace 原子地替换符号链接，
+    读者看到的要么是完整的旧版本，要么是完整的新版本，不会看到空目录。
+    carry_over 为 True 时先把上一个版本的节目硬链接进来（增量抓取只覆盖有更新的节目）。
+    切换后只保留新版本和切换前的版本（正在读取旧版本的用户不会读到一半被删除的目录），
+    其余版本目录和中途失败遗留的构建目录都会删除。
+    """
+
+    def __init__(self, base_folder, carry_over=False):
+        self.base_folder = base_folder.rstrip('/')
+        parent, name = os.path.split(self.base_folder)
+        self.versions_dir = os.path.join(parent, f".{name}.versions")
+        self.carry_over = carry_over
+        self.lock = threading.Lock()
+        self.index = {}
+        self.added = 0
+        self.staging = None
+        # start() 时符号链接指向的版本，切换后作为唯一保留的旧版本
+        self.previous = None
+
+    def current_version(self):
+        """当前版本目录，目标路径还不是符号链接时返回 None"""
+        if os.path.islink(self.base_folder):
+            return os.path.realpath(self.base_folder)
+        return None
+
+    def start(self):
+        os.makedirs(self.versions_dir, exist_ok=True)
+        stamp = time.strftime('%Y%m%dT%H%M%S')
+        # 目录名不会与已有版本重复；创建成功后才记为构建目录，abort() 不会删到别的版本
+        staging = tempfile.mkdtemp(prefix=f"{stamp}-", dir=self.versions_dir)
+        os.chmod(staging, 0o755)
+        self.staging = staging
+        current = self.previous = self.current_version()
+        if self.carry_over and current is not None:
+            self.index = self._load_index(current)
+            for entry in self.index.values():
+                for key in ('playlist', 'poster'):
+                    if entry.get(key):
+                        self._link(os.path.join(current, entry[key]), os.path.join(self.staging, entry[key]))
+        return self.staging
+
+    def _load_index(self, folder):
+        try:
+            with open(os.path.join(folder, INDEX_NAME), 'r', encoding='utf-8') as f:
+                return json.load(f).get('shows', {})
+        except (OSError, ValueError):
+            return {}
+
+    def _link(self, source, destination):
+        try:
+            os.link(source, destination)
+        except OSError:
+            if os.path.exists(source):
+                shutil.copyfile(source, destination)
+
+    def add_show(self, title, url, m3u8_links, poster_url=None):
+        """写入一个节目的合并播放列表，返回封面应保存到的路径（没有封面时为 None）"""
+        name = safe_name(title)
+        playlist = f"{name}.m3u"
+        # 先写临时文件再重命名，不会改动从上一个版本硬链接过来的同名文件
+        atomic_write(os.path.join(self.staging, playlist), render_m3u(m3u8_links).encode('utf-8'))
+        poster = f"{name}.jpg" if poster_url else None
+        with self.lock:
+            self.index[title] = {
+                'url': url,
+                'playlist': playlist,
+                'poster': poster,
+                'poster_url': poster_url,
+                'episodes': [[episode_title.split('$')[0].strip(), link] for episode_title, link in m3u8_links],
+            }
+            self.added += 1
+        return os.path.join(self.staging, poster) if poster else None
+
+    def commit(self):
+        """写索引并切换到新版本；本次没有写入任何节目时放弃切换，保留旧版本"""
+        if not self.added:
+            print(f"本次没有写入任何节目，保留当前版本: {self.base_folder}")
+            self.abort()
+            return False
+
+        for entry in self.index.values():
+            # 封面下载失败时不在索引里引用不存在的文件
+            if entry['poster'] and not os.path.exists(os.path.join(self.staging, entry['poster'])):
+                entry['poster'] = None
+        data = {'updated': time.strftime('%Y-%m-%dT%H:%M:%S'), 'shows': self.index}
+        atomic_write(os.path.join(self.staging, INDEX_NAME),
+                     json.dumps(data, ensure_ascii=False, separators=(',', ':'), sort_keys=True).encode('utf-8'))
+
+        if os.path.isdir(self.base_folder) and not os.path.islink(self.base_folder):
+            # 第一次切换：旧的普通目录移到版本目录下，之后按旧版本清理
+            self.previous = os.path.join(self.versions_dir, 'legacy')
+            os.replace(self.base_folder, self.previous)
+        link_path = f"{self.base_folder}.tmp-{os.getpid()}"
+        os.symlink(os.path.relpath(self.staging, os.path.dirname(self.base_folder) or '.'), link_path)
+        os.replace(link_path, self.base_folder)
+        print(f"已切换到新版本: {self.base_folder} -> {self.staging}（{len(self.index)} 个节目）")
+        # 切换后构建目录就是当前版本，之后再调用 abort() 也不会删除它
+        self.staging = None
+        self._cleanup()
+        return True
+
+    def abort(self):
+        """放弃本次构建，删除未完成的版本目录，符号链接保持指向当前版本"""
+        if self.staging and os.path.isdir(self.staging):
+            shutil.rmtree(self.staging)
+        self.staging = None
+
+    def _cleanup(self):
+        """只保留当前版本和切换前的版本，不按修改时间挑选
+
+        没有 index.json 的目录是中途失败遗留的构建目录，从不当作版本保留。
+        """
+        keep = {os.path.realpath(self.base_folder)}
+        if self.previous is not None:
+            keep.add(os.path.realpath(self.previous))
+        for name in os.listdir(self.versions_dir):
+            path = os.path.join(self.versions_dir, name)
+            if os.path.realpath(path) not in keep:
+                shutil.rmtree(path, ignore_errors=True)
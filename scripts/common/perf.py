@@ -0,0 +1,228 @@
+# 运行性能记录：阶段耗时、计数器和 HTTP 统计，结束时写出 JSON 报告
+#
+# 各脚本在关键路径上调用 stage() / count()，设置环境变量 PERF_REPORT 后才写报告：
+# 值为 1 时写入 .cache/perf，其他值作为报告目录。
+#
+# 比较同一任务最近两次报告（有退化时退出码为 1）：
+#     python scripts/common/perf.py compare --job huyazy_series
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# 默认报告目录
+PERF_DIR = '.cache/perf'
+
+# 每个任务最多保留的报告数
+KEEP_REPORTS = 30
+
+# 比较报告时，耗时增加超过该比例且超过最小绝对值才算退化
+REGRESSION_RATIO = 0.2
+REGRESSION_MIN_SECONDS = 0.05
+
+
+class Recorder:
+    """线程安全地累计各阶段的次数、总耗时和最大耗时，以及任意计数器
+
+    并发执行的阶段按任务分别计时，总耗时可能大于整个运行的墙钟时间。
+    """
+
+    def __init__(self, job):
+        self.job = job
+        self.started = time.time()
+        self.start = time.perf_counter()
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.counters = {}
+        self.sections = {}
+
+    def add_time(self, name, seconds):
+        with self.lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = {'count': 0, 'total': 0.0, 'max': 0.0}
+            stage['count'] += 1
+            stage['total'] += seconds
+            stage['max'] = max(stage['max'], seconds)
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def section(self, name, values):
+        """附加一组统计（例如 HTTP 客户端的 as_dict()）"""
+        with self.lock:
+            self.sections[name] = values
+
+    def report(self):
+        with self.lock:
+            stages = {name: {'count': s['count'], 'total': round(s['total'], 4), 'max': round(s['max'], 4)}
+                      for name, s in self.stages.items()}
+            return {
+                'job': self.job,
+                'started': datetime.fromtimestamp(self.started, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'wall': round(time.perf_counter() - self.start, 4),
+                'stages': stages,
+                'counters': dict(self.counters),
+                **{name: dict(values) for name, values in self.sections.items()},
+            }
+
+
+# 当前运行的记录器；start() 之前调用 stage()/count() 也能工作，记在默认任务下
+recorder = Recorder(os.path.splitext(os.path.basename(sys.argv[0] or 'job'))[0])
+
+
+def start(job):
+    """开始记录一个任务，返回记录器"""
+    global recorder
+    recorder = Recorder(job)
+    return recorder
+
+
+def stage(name):
+    return recorder.stage(name)
+
+
+def count(name, amount=1):
+    recorder.count(name, amount)
+
+
+def section(name, values):
+    recorder.section(name, values)
+
+
+def report_dir():
+    """PERF_REPORT 指定的报告目录，未开启时返回 None"""
+    value = os.environ.get('PERF_REPORT')
+    if not value or value == '0':
+        return None
+    return PERF_DIR if value == '1' else value
+
+
+def finish(http_stats=None):
+    """结束记录；开启了报告时写出 JSON 并返回路径"""
+    if http_stats is not None:
+        recorder.section('http', http_stats.as_dict())
+    folder = report_dir()
+    if folder is None:
+        return None
+    report = recorder.report()
+    os.makedirs(folder, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+    path = os.path.join(folder, f"{recorder.job}-{stamp}.json")
+    fd, tmp_path = tempfile.mkstemp(dir=folder)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+    for old in list_reports(folder, recorder.job)[:-KEEP_REPORTS]:
+        os.remove(old)
+    print(f"性能报告已写入 {path}（总耗时 {report['wall']:.2f} 秒）")
+    return path
+
+
+def list_reports(folder, job):
+    """某个任务的全部报告路径，按时间从旧到新排序"""
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        return []
+    prefix = f"{job}-"
+    return sorted(os.path.join(folder, name) for name in names
+                  if name.startswith(prefix) and name.endswith('.json') and name[len(prefix):][:1].isdigit())
+
+
+def load_report(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(old, new, ratio=REGRESSION_RATIO, min_seconds=REGRESSION_MIN_SECONDS):
+    """比较两份报告，返回 [(指标, 旧值, 新值, 是否退化)]
+
+    耗时类指标（总墙钟时间和各阶段总耗时）增加超过 ratio 且超过 min_seconds 时算退化；
+    计数器和 HTTP 统计只列出变化，不判断好坏。
+    """
+    rows = []
+
+    def timing(name, before, after):
+        regressed = (before is not None and after is not None
+                     and after - before > min_seconds and after > before * (1 + ratio))
+        rows.append((name, before, after, regressed))
+
+    timing('wall', old.get('wall'), new.get('wall'))
+    for name in sorted(set(old.get('stages', {})) | set(new.get('stages', {}))):
+        before = old.get('stages', {}).get(name, {}).get('total')
+        after = new.get('stages', {}).get(name, {}).get('total')
+        timing(f"stage.{name}", before, after)
+    for group in ('counters', 'http'):
+        before_values, after_values = old.get(group, {}), new.get(group, {})
+        for name in sorted(set(before_values) | set(after_values)):
+            before, after = before_values.get(name), after_values.get(name)
+            if before != after:
+                rows.append((f"{group}.{name}", before, after, False))
+    return rows
+
+
+def format_value(value):
+    if value is None:
+        return '-'
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
+
+
+def compare_command(args):
+    if args.old and args.new:
+        old_path, new_path = args.old, args.new
+    elif args.job:
+        reports = list_reports(args.dir, args.job)
+        if len(reports) < 2:
+            print(f"{args.dir} 中任务 {args.job} 的报告不足两份，无法比较")
+            return 2
+        old_path, new_path = reports[-2], reports[-1]
+    else:
+        print("请指定两份报告路径或 --job")
+        return 2
+
+    rows = compare(load_report(old_path), load_report(new_path), args.ratio, args.min_seconds)
+    print(f"比较 {old_path} -> {new_path}")
+    regressions = 0
+    for name, before, after, regressed in rows:
+        flag = '  <-- 退化' if regressed else ''
+        regressions += regressed
+        print(f"{name:<32} {format_value(before):>12} {format_value(after):>12}{flag}")
+    print(f"发现 {regressions} 项退化" if regressions else "没有发现退化")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="性能报告工具")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_compare = sub.add_parser('compare', help="比较两份报告，有退化时退出码为 1")
+    p_compare.add_argument('old', nargs='?', help="旧报告路径，省略时取该任务倒数第二份报告")
+    p_compare.add_argument('new', nargs='?', help="新报告路径，省略时取该任务最新一份报告")
+    p_compare.add_argument('--job', help="任务名（报告文件名前缀），不指定报告路径时必填")
+    p_compare.add_argument('--dir', default=PERF_DIR, help="报告目录")
+    p_compare.add_argument('--ratio', type=float, default=REGRESSION_RATIO,
+                           help="耗时增加超过该比例算退化")
+    p_compare.add_argument('--min-seconds', type=float, default=REGRESSION_MIN_SECONDS,
+                           help="耗时增加小于该秒数时忽略")
+    args = parser.parse_args()
+    sys.exit(compare_command(args))
+
+
+if __name__ == "__main__":
+    main()
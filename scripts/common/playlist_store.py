@@ -0,0 +1,115 @@
+import os
+import re
+import json
+import hashlib
+import threading
+import tempfile
+
+# 清单文件名，记录每个播放列表的内容哈希和来源详情页
+MANIFEST_NAME = 'manifest.json'
+
+# 文件名中不允许出现的字符
+UNSAFE_NAME_RE = re.compile(r'[<>:"/\\|?*]')
+
+
+def safe_name(text):
+    """去掉文件名中不允许出现的字符"""
+    return UNSAFE_NAME_RE.sub('', text)
+
+
+def render_m3u(m3u8_links):
+    """把 (标题, 链接) 列表渲染为 M3U 文本，标题只保留 $ 前的部分"""
+    lines = ["#EXTM3U\n"]
+    for episode_title, link in m3u8_links:
+        cleaned_title = episode_title.split('$')[0]
+        lines.append(f"#EXTINF:-1,{cleaned_title}\n")
+        lines.append(f"{link}\n")
+    return "".join(lines)
+
+
+def atomic_write(file_path, data):
+    """先写临时文件再重命名，读者不会看到写了一半的文件"""
+    folder = os.path.dirname(file_path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class PlaylistStore:
+    """带清单的增量 M3U 写入器
+
+    只有内容哈希变化的播放列表才会重写；运行结束时只删除已经不在列表页中的节目，
+    详情页临时抓取失败的节目会保留上一次的文件。
+    """
+
+    def __init__(self, folder_path, manifest_name=MANIFEST_NAME):
+        self.folder_path = folder_path
+        self.manifest_path = os.path.join(folder_path, manifest_name)
+        self.lock = threading.Lock()
+        self.written = {}
+        self.unchanged = 0
+        self.updated = 0
+        os.makedirs(folder_path, exist_ok=True)
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def write(self, url, filename, m3u8_links):
+        """写入一个节目的播放列表，内容未变化时跳过，返回是否实际写入"""
+        data = render_m3u(m3u8_links).encode('utf-8')
+        digest = hashlib.sha1(data).hexdigest()
+        file_path = os.path.join(self.folder_path, filename)
+
+        with self.lock:
+            self.written[filename] = {'hash': digest, 'url': url}
+            previous = self.manifest.get(filename)
+            if previous and previous.get('hash') == digest and os.path.exists(file_path):
+                self.unchanged += 1
+                return False
+
+        atomic_write(file_path, data)
+        with self.lock:
+            self.updated += 1
+        return True
+
+    def finish(self, listed_urls, complete=True):
+        """清理下架节目并保存清单
+
+        listed_urls 为本次列表页中出现的全部详情页地址；complete 为 False 表示
+        有列表页抓取失败，此时不删除任何文件，避免误删。
+        """
+        written_urls = {entry['url'] for entry in self.written.values()}
+        manifest = dict(self.written)
+        removed = []
+
+        for file_name in sorted(os.listdir(self.folder_path)):
+            if not file_name.endswith('.m3u') or file_name in self.written:
+                continue
+            previous = self.manifest.get(file_name)
+            still_listed = (previous is not None
+                            and previous.get('url') in listed_urls
+                            and previous.get('url') not in written_urls)
+            if still_listed or not complete:
+                # 节目仍在列表中（或本次结果不完整），保留旧文件
+                if previous is not None:
+                    manifest[file_name] = previous
+                continue
+            os.remove(os.path.join(self.folder_path, file_name))
+            removed.append(file_name)
+
+        atomic_write(self.manifest_path,
+                     json.dumps(manifest, ensure_ascii=False, indent=1, sort_keys=True).encode('utf-8'))
+        self.manifest = manifest
+        return removed
@@ -0,0 +1,178 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from common.rate_limit import RETRY_STATUS, backoff_delay
+from common.http_client import PooledSession
+
+# 流式下载的分块大小
+CHUNK_SIZE = 64 * 1024
+
+
+class PosterStore:
+    """按内容哈希去重的封面图片仓库
+
+    图片流式写入 blobs/<sha256>，index.json 记录每个 URL 的 ETag / Last-Modified
+    和对应的哈希，再次下载时发送条件请求，304 直接复用已有文件。
+    """
+
+    def __init__(self, store_dir, session=None, limiter=None, timeout=(10, 60), max_retries=3):
+        self.store_dir = store_dir
+        self.blob_dir = os.path.join(store_dir, 'blobs')
+        self.index_path = os.path.join(store_dir, 'index.json')
+        self.session = session or PooledSession()
+        self.limiter = limiter
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.lock = threading.Lock()
+        self.stats = {'downloaded': 0, 'not_modified': 0, 'deduplicated': 0, 'failed': 0, 'bytes': 0}
+        os.makedirs(self.blob_dir, exist_ok=True)
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            self.index = {}
+
+    def blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest)
+
+    def _count(self, key, amount=1):
+        with self.lock:
+            self.stats[key] += amount
+
+    def fetch(self, url):
+        """返回 URL 对应图片在仓库中的路径，失败时返回 None"""
+        with self.lock:
+            entry = self.index.get(url)
+        if entry and not os.path.exists(self.blob_path(entry['sha256'])):
+            entry = None
+
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        for attempt in range(self.max_retries):
+            if self.limiter is not None:
+                self.limiter.acquire(url)
+            try:
+                with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                    if response.status_code == 304 and entry:
+                        self._count('not_modified')
+                        return self.blob_path(entry['sha256'])
+                    if response.status_code in RETRY_STATUS and self.limiter is not None:
+                        self.limiter.penalize(url)
+                    response.raise_for_status()
+                    digest = self._stream_to_blob(response)
+                    with self.lock:
+                        self.index[url] = {
+                            'sha256': digest,
+                            'etag': response.headers.get('ETag'),
+                            'last_modified': response.headers.get('Last-Modified'),
+                            'fetched_at': time.time(),
+                        }
+                    return self.blob_path(digest)
+            except requests.RequestException as e:
+                status = e.response.status_code if getattr(e, 'response', None) is not None else None
+                print(f"封面图片下载失败 (尝试 {attempt+1}/{self.max_retries}): {url} {e}")
+                if status is not None and status not in RETRY_STATUS:
+                    break
+                if attempt + 1 < self.max_retries:
+                    time.sleep(backoff_delay(attempt))
+        self._count('failed')
+        return None
+
+    def _stream_to_blob(self, response):
+        """边下载边计算哈希，写入临时文件后按哈希重命名"""
+        sha = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.blob_dir, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    sha.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            digest = sha.hexdigest()
+            target = self.blob_path(digest)
+            if os.path.exists(target):
+                os.remove(tmp_path)
+                self._count('deduplicated')
+            else:
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, target)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._count('downloaded')
+        self._count('bytes', size)
+        return digest
+
+    def save(self):
+        """原子地写回索引，只保留仍有对应文件的记录"""
+        with self.lock:
+            index = {url: entry for url, entry in self.index.items()
+                     if os.path.exists(self.blob_path(entry['sha256']))}
+            fd, tmp_path = tempfile.mkstemp(dir=self.store_dir)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(index, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+
+
+def link_file(source, destination):
+    """把仓库中的文件硬链接到目标位置，跨文件系统时退回为复制"""
+    if os.path.exists(destination) and os.path.samefile(source, destination):
+        return
+    folder = os.path.dirname(destination) or '.'
+    tmp_path = os.path.join(folder, f".tmp-{os.getpid()}-{threading.get_ident()}-{os.path.basename(destination)}")
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, destination)
+
+
+class PosterDownloader:
+    """独立线程池下载封面，与页面解析互不阻塞"""
+
+    def __init__(self, store, workers=4):
+        self.store = store
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.futures = []
+
+    def _download(self, url, destination):
+        blob = self.store.fetch(url)
+        if blob is None:
+            return False
+        link_file(blob, destination)
+        return True
+
+    def submit(self, url, destination):
+        future = self.executor.submit(self._download, url, destination)
+        self.futures.append(future)
+        return future
+
+    def close(self):
+        """等待全部下载完成并保存索引，返回成功的数量"""
+        self.executor.shutdown(wait=True)
+        done = 0
+        for future in self.futures:
+            # 打包输出放弃本次构建时会取消还没开始的下载
+            if future.cancelled():
+                continue
+            try:
+                done += bool(future.result())
+            except OSError as e:
+                print(f"封面图片保存失败: {e}")
+        self.store.save()
+        return done
@@ -0,0 +1,64 @@
+import os
+import json
+import time
+import tempfile
+
+# EWMA 平滑系数：越大越看重最近一次的测量
+DEFAULT_ALPHA = 0.3
+
+# 超过该天数未出现的端点从历史中删除
+EXPIRE_DAYS = 30
+
+
+class ProbeHistory:
+    """跨运行保存每个端点延迟和丢包率的指数加权移动平均"""
+
+    def __init__(self, path, alpha=DEFAULT_ALPHA):
+        self.path = path
+        self.alpha = alpha
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def update(self, key, latency_ms, loss):
+        """记录一次测量；latency_ms 为 None 表示本次完全不可达"""
+        now = time.time()
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = {'ewma': latency_ms, 'loss': loss, 'runs': 0}
+        else:
+            if entry.get('ewma') is None:
+                entry['ewma'] = latency_ms
+            elif latency_ms is not None:
+                entry['ewma'] += self.alpha * (latency_ms - entry['ewma'])
+            entry['loss'] += self.alpha * (loss - entry['loss'])
+        entry['runs'] += 1
+        entry['last_seen'] = now
+        entry['last_ms'] = latency_ms
+        self.entries[key] = entry
+        return entry
+
+    def latency(self, key):
+        """平滑后的延迟（毫秒），没有数据时为 None"""
+        entry = self.entries.get(key)
+        return entry.get('ewma') if entry else None
+
+    def score(self, key):
+        """排序分数（越小越好）：平滑延迟按平滑丢包率放大，没有数据时为 None"""
+        entry = self.entries.get(key)
+        if not entry or entry.get('ewma') is None:
+            return None
+        return entry['ewma'] * (1 + entry['loss'])
+
+    def save(self):
+        """删除长期未出现的端点后原子地写回"""
+        cutoff = time.time() - EXPIRE_DAYS * 86400
+        self.entries = {k: v for k, v in self.entries.items() if v.get('last_seen', 0) >= cutoff}
+        folder = os.path.dirname(self.path) or '.'
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=folder)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, sort_keys=True)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,116 @@
+import time
+import random
+import threading
+from urllib.parse import urlsplit
+
+# 需要退避重试的状态码
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+def origin_of(url):
+    """返回 URL 的来源 (协议://主机:端口)"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+def backoff_delay(attempt, base=1.0, cap=30.0):
+    """指数退避加完全随机抖动：第 attempt 次重试前等待 [0, base*2^attempt] 秒"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def retry_after_seconds(headers, cap=60.0):
+    """解析 Retry-After 头（只支持秒数形式），没有或无法解析时返回 None"""
+    value = headers.get('Retry-After') if headers else None
+    if value is None:
+        return None
+    try:
+        return min(cap, max(0.0, float(value)))
+    except ValueError:
+        return None
+
+
+class TokenBucket:
+    """线程安全的令牌桶，rate 为每秒补充的令牌数，burst 为桶容量
+
+    收到 429/5xx 时调用 penalize() 把速率减半，成功时调用 reward() 逐步恢复到设定值。
+    rate 不大于 0 时不限速。
+    """
+
+    def __init__(self, rate, burst=None, min_rate=0.2):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.min_rate = min(min_rate, self.max_rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """取走一个令牌，令牌不足时阻塞等待，返回等待的秒数"""
+        if self.max_rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def reserve(self):
+        """不阻塞地预订一个令牌（令牌不足时记为欠账），返回需要等待的秒数
+
+        供事件循环中的调用方使用：拿到秒数后自己 await asyncio.sleep()，后来的调用方排在欠账之后。
+        """
+        if self.max_rate <= 0:
+            return 0.0
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+    def penalize(self):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+
+    def reward(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.1)
+
+
+class OriginRateLimiter:
+    """按来源分别限速，每个来源一个令牌桶"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def bucket(self, url):
+        origin = origin_of(url)
+        with self.lock:
+            if origin not in self.buckets:
+                self.buckets[origin] = TokenBucket(self.rate, self.burst)
+            return self.buckets[origin]
+
+    def acquire(self, url):
+        return self.bucket(url).acquire()
+
+    def reserve(self, url):
+        return self.bucket(url).reserve()
+
+    def penalize(self, url):
+        self.bucket(url).penalize()
+
+    def reward(self, url):
+        self.bucket(url).reward()
@@ -0,0 +1,153 @@
+import re
+import ssl
+import time
+import asyncio
+import ipaddress
+import statistics
+
+# 默认全局并发连接数和单次连接超时（秒）
+DEFAULT_CONCURRENCY = 1000
+DEFAULT_TIMEOUT = 3.0
+
+HOSTNAME_RE = re.compile(r'^(?=.{1,253}$)([A-Za-z0-9]([A-Za-z0-9-]{0,61}[A-Za-z0-9])?\.)*[A-Za-z0-9]([A-Za-z0-9-]{0,61}[A-Za-z0-9])?$')
+
+
+def parse_endpoint(line, default_port=None):
+    """解析一行 '主机:端口#注释'，支持 IPv4、'[IPv6]:端口' 和域名
+
+    返回 (主机, 端口)，格式不正确时返回 None。没有端口时使用 default_port，
+    default_port 为 None 则视为格式不正确。
+    """
+    address = line.split('#')[0].strip().replace(" ", "")
+    if not address:
+        return None
+
+    if address.startswith('['):
+        host, sep, rest = address[1:].partition(']')
+        if not sep:
+            return None
+        if rest.startswith(':'):
+            port = rest[1:]
+        elif not rest:
+            port = None
+        else:
+            return None
+    elif address.count(':') == 1:
+        host, port = address.split(':')
+    elif address.count(':') > 1:
+        # 不带方括号的 IPv6 地址，无法区分端口
+        host, port = address, None
+    else:
+        host, port = address, None
+
+    if port is None:
+        port = default_port
+    try:
+        port = int(port)
+    except (TypeError, ValueError):
+        return None
+    if not 0 < port < 65536:
+        return None
+
+    try:
+        host = str(ipaddress.ip_address(host))
+    except ValueError:
+        if not HOSTNAME_RE.match(host):
+            return None
+    return host, port
+
+
+async def handshake(host, port, timeout=DEFAULT_TIMEOUT, ssl_context=None, server_name=None):
+    """建立一次连接，返回 (TCP 握手耗时, TLS 握手耗时)，单位秒
+
+    TCP 连接失败返回 (None, None)；未启用 TLS 或 TLS 握手失败时第二项为 None。
+    """
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    try:
+        transport, protocol = await asyncio.wait_for(
+            loop.create_connection(asyncio.Protocol, host, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return None, None
+    tcp_time = time.perf_counter() - start
+
+    tls_time = None
+    try:
+        if ssl_context is not None:
+            start = time.perf_counter()
+            try:
+                tls_transport = await asyncio.wait_for(
+                    loop.start_tls(transport, protocol, ssl_context,
+                                   server_hostname=server_name or host), timeout)
+                tls_time = time.perf_counter() - start
+                tls_transport.close()
+            except (OSError, ssl.SSLError, asyncio.TimeoutError, ConnectionError):
+                pass
+    finally:
+        transport.close()
+    return tcp_time, tls_time
+
+
+async def probe(host, port, timeout=DEFAULT_TIMEOUT):
+    """尝试建立 TCP 连接，成功返回握手耗时（秒），失败返回 None"""
+    tcp_time, _ = await handshake(host, port, timeout)
+    return tcp_time
+
+
+async def scan(endpoints, concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT):
+    """并发探测 [(主机, 端口), ...]，按输入顺序返回耗时列表（不可达为 None）
+
+    semaphore 限制同时在进行中的连接数，每次连接都有独立的超时。
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(host, port):
+        async with semaphore:
+            return await probe(host, port, timeout)
+
+    return await asyncio.gather(*(limited(host, port) for host, port in endpoints))
+
+
+def scan_endpoints(endpoints, concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT):
+    """scan() 的同步封装"""
+    return asyncio.run(scan(endpoints, concurrency, timeout))
+
+
+def make_tls_context():
+    """只用于测量握手耗时的 TLS 上下文，不校验证书"""
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+async def measure(host, port, samples=3, timeout=DEFAULT_TIMEOUT, ssl_context=None, server_name=None):
+    """对一个端点连续采样多次，返回 {'tcp': 中位数, 'tls': 中位数, 'loss': 失败比例}
+
+    耗时单位为毫秒，全部失败时 tcp 为 None。
+    """
+    tcp_times, tls_times = [], []
+    for _ in range(samples):
+        tcp_time, tls_time = await handshake(host, port, timeout, ssl_context, server_name)
+        if tcp_time is not None:
+            tcp_times.append(tcp_time * 1000)
+        if tls_time is not None:
+            tls_times.append(tls_time * 1000)
+    return {
+        'tcp': statistics.median(tcp_times) if tcp_times else None,
+        'tls': statistics.median(tls_times) if tls_times else None,
+        'loss': 1 - len(tcp_times) / samples,
+    }
+
+
+async def scan_latency(endpoints, samples=3, concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT,
+                       tls=False, server_name=None):
+    """并发测量每个端点的握手耗时，按输入顺序返回 measure() 的结果"""
+    semaphore = asyncio.Semaphore(concurrency)
+    ssl_context = make_tls_context() if tls else None
+
+    async def limited(host, port):
+        async with semaphore:
+            return await measure(host, port, samples, timeout, ssl_context, server_name)
+
+    return await asyncio.gather(*(limited(host, port) for host, port in endpoints))
@@ -0,0 +1,133 @@
+import os
+import sys
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common.crawl_engine import (PER_HOST_LIMIT, CONNECT_TIMEOUT, REQUEST_TIMEOUT,
+                                 Category, CrawlEngine, PlaylistLayout, ShowFolderLayout, PackedLayout)
+from common.frontier import FRONTIER_PATH, CrawlFrontier
+from common.http_cache import ResponseCache
+from common.http_client import PooledSession
+from common.rate_limit import OriginRateLimiter
+from common.posters import PosterStore, PosterDownloader
+from common.packed_output import PackedOutput
+from common import perf
+
+# 详情页响应缓存目录，与 aaa/test1.py 共用
+CACHE_DIR = '.cache/huyazy'
+
+# 每个来源每秒最多请求数（页面和封面共用）
+REQUESTS_PER_SECOND = 2.0
+
+# 封面图片仓库目录（与 scripts/test.py 共用）和下载线程数
+POSTER_STORE_DIR = '.cache/posters'
+POSTER_WORKERS = 4
+
+# 要抓取的分类：(名称, 分类编号, 布局, 输出目录)
+# 新增分类只需在这里加一行，与其他分类在同一个进程中共用连接池和缓存
+CATEGORIES = [
+    ('电视剧', 20, 'playlist', 'scripts/aaa'),
+    ('综艺', 27, 'show_folder', '/opt/scripts/aaa/综艺'),
+]
+
+# 命令行参数
+def parse_args():
+    parser = argparse.ArgumentParser(description="在一个进程中并发抓取 huyazy 的多个分类")
+    parser.add_argument('--only', nargs='+', default=None,
+                        help="只抓取这些分类（名称或分类编号），默认全部")
+    parser.add_argument('--pages', type=int, default=2,
+                        help="每个分类抓取的列表页数")
+    parser.add_argument('--catalog', action='store_true',
+                        help="按进度库翻完整个分类，只抓取新增或有更新的节目")
+    parser.add_argument('--full', action='store_true',
+                        help="--catalog 模式强制翻完所有列表页，并清理已下架的节目")
+    parser.add_argument('--frontier', default=FRONTIER_PATH,
+                        help="--catalog 模式的进度库（SQLite）路径")
+    parser.add_argument('--per-host', type=int, default=PER_HOST_LIMIT,
+                        help="每个主机的最大并发连接数（所有分类合计）")
+    parser.add_argument('--connect-timeout', type=float, default=CONNECT_TIMEOUT,
+                        help="建立连接的超时时间（秒）")
+    parser.add_argument('--timeout', type=float, default=REQUEST_TIMEOUT,
+                        help="单次请求的总超时时间（秒）")
+    parser.add_argument('--cache-dir', default=CACHE_DIR,
+                        help="详情页响应缓存目录")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="禁用详情页条件请求缓存")
+    parser.add_argument('--no-validate', action='store_true',
+                        help="不检查剧集链接的可用性和镜像速度")
+    parser.add_argument('--poster-workers', type=int, default=POSTER_WORKERS,
+                        help="并发下载封面图片的线程数")
+    parser.add_argument('--rps', type=float, default=REQUESTS_PER_SECOND,
+                        help="每个来源每秒最多发出的请求数，0 表示不限速")
+    parser.add_argument('--burst', type=float, default=None,
+                        help="令牌桶容量，默认等于 --rps")
+    parser.add_argument('--packed', action='store_true',
+                        help="节目文件夹类分类改为每个节目一个合并播放列表和 index.json，构建完成后一次切换")
+    return parser.parse_args()
+
+# 按配置创建分类
+def build_categories(args, posters):
+    categories = []
+    for name, type_id, layout_name, folder_path in CATEGORIES:
+        if args.only and name not in args.only and str(type_id) not in args.only:
+            continue
+        if layout_name == 'playlist':
+            layout = PlaylistLayout(folder_path, validate=not args.no_validate)
+        elif args.packed:
+            # 增量抓取时沿用上一个版本的节目，只覆盖新增或有更新的
+            layout = PackedLayout(PackedOutput(folder_path, carry_over=args.catalog), posters)
+        else:
+            # 增量抓取保留已有节目；否则先清空目标文件夹
+            layout = ShowFolderLayout(folder_path, posters, clear=not args.catalog)
+        categories.append(Category(name, type_id, layout, pages=args.pages,
+                                   catalog=args.catalog, full=args.full))
+    return categories
+
+# 主函数
+def main():
+    args = parse_args()
+    perf.start('huyazy_all')
+
+    # 页面请求和封面下载共用一个按来源限速的限速器
+    limiter = OriginRateLimiter(args.rps, args.burst)
+    poster_session = PooledSession(pool_size=max(args.poster_workers, 1))
+    posters = PosterDownloader(PosterStore(POSTER_STORE_DIR, poster_session, limiter), args.poster_workers)
+    categories = build_categories(args, posters)
+    if not categories:
+        sys.exit(f"没有匹配的分类: {' '.join(args.only)}")
+
+    cache = None
+    if not args.no_cache:
+        cache = ResponseCache(args.cache_dir)
+    frontier = CrawlFrontier(args.frontier) if args.catalog else None
+
+    engine = CrawlEngine(categories, per_host=args.per_host, connect_timeout=args.connect_timeout,
+                         request_timeout=args.timeout, cache=cache, frontier=frontier, limiter=limiter)
+    try:
+        summary = asyncio.run(engine.run())
+    finally:
+        if frontier is not None:
+            frontier.close()
+        # 页面全部处理完（或中途失败）后等待封面下载结束
+        with perf.stage('poster_drain'):
+            saved = posters.close()
+        poster_session.close()
+
+    for name, counts in summary.items():
+        print(f"{name}: " + '，'.join(f"{key} {value}" for key, value in counts.items()))
+        perf.section(f"category_{name}", counts)
+    print(f"详情页请求 {len(engine.visited)} 个，其中 {engine.shared} 次由多个分类共享，封面保存 {saved} 张")
+    print(engine.stats.summary())
+
+    if cache is not None:
+        evicted = cache.evict()
+        cache.save()
+        print(f"缓存命中 {cache.hits} 次，未命中 {cache.misses} 次，淘汰过期记录 {evicted} 条")
+        perf.count('cache_hits', cache.hits)
+        perf.count('cache_misses', cache.misses)
+
+    perf.finish()
+
+if __name__ == "__main__":
+    main()
@@ -1,69 +1,225 @@
 import os
+import sys
+import json
+import base64
+import hashlib
+import tempfile
+from urllib.parse import quote
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import perf
+from common.playlist_store import atomic_write
 
 # 确定当前脚本所在目录
 script_dir = os.path.dirname(os.path.abspath(__file__))
 
 # 定义文件路径
 input_file = os.path.join(script_dir, 'ip.txt')
-output_file = os.path.join(script_dir, 'hao.txt')
-
-# 确保 ip.txt 存在
-if not os.path.exists(input_file):
-    raise FileNotFoundError(f"Input file '{input_file}' does not exist.")
-
-# 读取 ip.txt 并处理
-try:
-    # 读取现有内容（如文件不存在，则视为内容为空）
-    if os.path.exists(output_file):
-        with open(output_file, 'r', encoding='utf-8') as outfile:
-            old_content = outfile.read()
-    else:
-        old_content = ""
-
-    # 读取 ip.txt 的内容
-    with open(input_file, 'r', encoding='utf-8') as infile:
-        lines = infile.readlines()
-
-    # 节点模板
-    template = (
-        "vless://90cd4a77-141a-43c9-991b-08263cfe9c10@{ip}:443"
-        "?encryption=none&security=tls&sni=tlsjiedian.linyu230.us.kg"
-        "&fp=random&allowInsecure=1&type=ws&host=tlsjiedian.linyu230.us.kg"
-        "&path=%2FproxyIP%3Dproxyip.aliyun.fxxk.dedyn.io#hao"
+digest_file = os.path.join(script_dir, 'digests.json')
+
+# 节点模板配置：每个配置生成一组输出文件（原始链接、base64 订阅、Clash 节点）
+PROFILES = {
+    "hao": {
+        "uuid": "90cd4a77-141a-43c9-991b-08263cfe9c10",
+        "port": 443,
+        "sni": "tlsjiedian.linyu230.us.kg",
+        "host": "tlsjiedian.linyu230.us.kg",
+        "path": "/proxyIP=proxyip.aliyun.fxxk.dedyn.io",
+        "fingerprint": "random",
+        "outputs": {
+            "raw": "hao.txt",
+            "base64": "hao_base64.txt",
+            "clash": "hao_clash.yaml",
+        },
+    },
+}
+
+
+def read_ips(path):
+    """逐行读取 ip.txt，只取逗号前的 IP，跳过空行"""
+    with open(path, 'r', encoding='utf-8') as infile:
+        for line in infile:
+            ip = line.split(',')[0].strip()
+            if ip:  # 确保 IP 不为空
+                yield ip
+
+
+def vless_uri(name, profile, ip):
+    """生成一条 vless 链接"""
+    server = f"[{ip}]" if ':' in ip else ip
+    return (
+        f"vless://{profile['uuid']}@{server}:{profile['port']}"
+        f"?encryption=none&security=tls&sni={profile['sni']}"
+        f"&fp={profile['fingerprint']}&allowInsecure=1&type=ws&host={profile['host']}"
+        f"&path={quote(profile['path'], safe='')}#{name}"
     )
-    
-    # 生成新的节点信息
-    nodes = []
-    for line in lines:
-        ip = line.split(',')[0].strip()
-        if ip:  # 确保 IP 不为空
-            nodes.append(template.format(ip=ip))
-    
-    new_content = '\n'.join(nodes)
-
-    # 写入 hao.txt（只有内容变更时才更新）
-    if old_content.strip() != new_content.strip():
-        with open(output_file, 'w', encoding='utf-8') as outfile:
-            outfile.write(new_content)
-        print(f"Nodes saved to '{output_file}'. Total nodes: {len(nodes)}")
-        
-        # 提交文件更改
-        os.system("git config --global user.name 'GitHub Actions'")
-        os.system("git config --global user.email 'actions@github.com'")
-        os.system(f"git add {output_file}")
-        commit_message = "Update IP list with port and tag"
-        result = os.system(f"git commit -m '{commit_message}'")
-        
-        if result == 0:
-            os.system("git push origin main")
-        else:
-            print("No changes to commit (unexpected).")
+
+
+def clash_proxy(name, profile, ip):
+    """生成一条 Clash 节点（单行 flow 格式，与 kxwl.yaml 一致）"""
+    return (
+        f"  - {{name: {name} {ip}, type: vless, server: {ip}, port: {profile['port']}, "
+        f"uuid: {profile['uuid']}, tls: true, servername: {profile['sni']}, "
+        f"client-fingerprint: {profile['fingerprint']}, skip-cert-verify: true, network: ws, "
+        f"ws-opts: {{path: \"{profile['path']}\", headers: {{Host: {profile['host']}}}}}, udp: true}}"
+    )
+
+
+class DigestWriter:
+    """写入临时文件并同时计算 sha256，内容与记录的摘要相同时不替换原文件"""
+
+    def __init__(self, path):
+        self.path = path
+        self.sha = hashlib.sha256()
+        fd, self.tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        self.file = os.fdopen(fd, 'wb')
+
+    def write(self, data):
+        self.sha.update(data)
+        self.file.write(data)
+
+    def finish(self, old_digest):
+        """返回 (摘要, 是否有变化)"""
+        self.file.close()
+        digest = self.sha.hexdigest()
+        if digest == old_digest and os.path.exists(self.path):
+            os.remove(self.tmp_path)
+            return digest, False
+        os.chmod(self.tmp_path, 0o644)
+        os.replace(self.tmp_path, self.path)
+        return digest, True
+
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+class RawOutput:
+    """原始链接，每行一条，末尾不带换行（与原来的 hao.txt 相同）"""
+
+    def __init__(self, path):
+        self.writer = DigestWriter(path)
+        self.first = True
+
+    def add(self, uri):
+        self.writer.write((uri if self.first else '\n' + uri).encode('utf-8'))
+        self.first = False
+
+    def close(self):
+        return self.writer
+
+
+class Base64Output(RawOutput):
+    """base64 订阅：对原始链接文本流式编码，每次只编码 3 字节整数倍的数据"""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.pending = b''
+
+    def add(self, uri):
+        self.pending += (uri if self.first else '\n' + uri).encode('utf-8')
+        self.first = False
+        cut = len(self.pending) - len(self.pending) % 3
+        if cut:
+            self.writer.write(base64.b64encode(self.pending[:cut]))
+            self.pending = self.pending[cut:]
+
+    def close(self):
+        self.writer.write(base64.b64encode(self.pending))
+        return self.writer
+
+
+class ClashOutput:
+    """Clash proxies 块，同一个 IP 只写一次以保证节点名唯一"""
+
+    def __init__(self, path):
+        self.writer = DigestWriter(path)
+        self.writer.write(b"proxies:\n")
+        self.seen = set()
+
+    def add(self, line, ip):
+        if ip in self.seen:
+            return
+        self.seen.add(ip)
+        self.writer.write((line + '\n').encode('utf-8'))
+
+    def close(self):
+        return self.writer
+
+
+def load_digests(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def generate(profiles, ip_path, output_dir):
+    """单次遍历 ip.txt，同时写出所有配置的所有格式，返回 (节点数, 有变化的文件列表)"""
+    outputs = []
+    for name, profile in profiles.items():
+        paths = profile['outputs']
+        outputs.append((name, profile,
+                        RawOutput(os.path.join(output_dir, paths['raw'])),
+                        Base64Output(os.path.join(output_dir, paths['base64'])),
+                        ClashOutput(os.path.join(output_dir, paths['clash']))))
+
+    count = 0
+    try:
+        for ip in read_ips(ip_path):
+            count += 1
+            for name, profile, raw, b64, clash in outputs:
+                uri = vless_uri(name, profile, ip)
+                raw.add(uri)
+                b64.add(uri)
+                clash.add(clash_proxy(name, profile, ip), ip)
+    except BaseException:
+        for _, _, *writers in outputs:
+            for output in writers:
+                output.close().abort()
+        raise
+
+    digests = load_digests(digest_file)
+    changed = []
+    for _, _, *writers in outputs:
+        for output in writers:
+            writer = output.close()
+            key = os.path.basename(writer.path)
+            digests[key], updated = writer.finish(digests.get(key))
+            if updated:
+                changed.append(writer.path)
+
+    if changed:
+        # 中途崩溃时保留旧的摘要文件，下次运行重新比较
+        atomic_write(digest_file, json.dumps(digests, indent=2, sort_keys=True).encode('utf-8'))
+    return count, changed
+
+
+def main():
+    # 确保 ip.txt 存在
+    if not os.path.exists(input_file):
+        raise FileNotFoundError(f"Input file '{input_file}' does not exist.")
+
+    perf.start('ddd_nodes')
+    try:
+        with perf.stage('generate'):
+            count, changed = generate(PROFILES, input_file, script_dir)
+    except Exception as e:
+        print(f"Error processing file: {e}")
+        sys.exit(1)
+
+    if changed:
+        for path in changed:
+            print(f"Nodes saved to '{path}'.")
+        print(f"Total nodes: {count}")
     else:
-        print("No changes detected in 'hao.txt', skipping update.")
+        print("No changes detected in generated files, skipping update.")
+    perf.count('nodes', count)
+    perf.count('files_changed', len(changed))
+    perf.finish()
 
-    # 返回成功退出码
-    exit(0)
 
-except Exception as e:
-    print(f"Error processing file: {e}")
-    exit(1)
+if __name__ == "__main__":
+    main()
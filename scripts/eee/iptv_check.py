@@ -0,0 +1,302 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from collections import deque
+from urllib.parse import urlsplit
+
+import aiohttp
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.http_client import ClientStats, make_async_session
+from common import perf
+from iptv_lists import UrlIndex, read_any, dedup, normalize_url, grouped, writer_for
+
+# 默认检查的列表文件
+DEFAULT_FILES = [
+    'data/test/tv.txt', 'data/test/tv1.txt', 'data/test/tv2.txt', 'data/test/tv3.txt',
+    'data/test/zubo.txt', 'data/test/shanxi.txt',
+    'data/test/IPTV.m3u', 'data/test/zubo.m3u', 'data/test/shanxi.m3u', 'data/test/taiwan.m3u',
+]
+
+# 检查结果缓存文件和有效期（小时）
+CACHE_PATH = '.cache/iptv_check.json'
+CACHE_TTL_HOURS = 6
+
+# 总并发数、每个主机的并发数和单条检查超时（秒）
+CONCURRENCY = 200
+PER_HOST = 4
+TIMEOUT = 8
+
+# 已读入但尚未开始检查的地址数上限，超过时暂停读取列表
+PENDING_LIMIT = 100000
+
+# 每条地址最多读取的字节数，够判断是否真的在出流
+FIRST_BYTES = 2048
+
+# 只检查 HTTP 地址，组播和其他协议原样保留
+CHECK_SCHEMES = ('http://', 'https://')
+
+
+class CheckCache:
+    """按规范化地址保存检查结果，过期的记录在下次运行时重新检查"""
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def fresh(self, key, now=None):
+        """未过期的结果，没有或已过期时返回 None"""
+        entry = self.entries.get(key)
+        if entry and (now or time.time()) - entry['checked'] < self.ttl:
+            return entry
+        return None
+
+    def put(self, key, alive, latency_ms, status):
+        self.entries[key] = {'alive': alive, 'ms': latency_ms, 'status': status, 'checked': time.time()}
+
+    def save(self):
+        """去掉过期很久的记录后原子地写回"""
+        cutoff = time.time() - self.ttl * 4
+        self.entries = {k: v for k, v in self.entries.items() if v['checked'] >= cutoff}
+        folder = os.path.dirname(self.path) or '.'
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=folder)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+
+# 判断返回的前几个字节是否像一条可播放的流
+def looks_alive(url, status, data):
+    if status >= 400 or not data:
+        return False
+    if '.m3u8' in url.lower():
+        return data.lstrip(b'\xef\xbb\xbf \r\n\t').startswith(b'#EXTM3U')
+    # 普通地址返回 HTML 一般是错误页
+    return not data.lstrip()[:15].lower().startswith((b'<!doctype html', b'<html'))
+
+
+async def read_head(session, url, first_bytes):
+    start = time.perf_counter()
+    async with session.get(url, allow_redirects=True) as response:
+        data = await response.content.read(first_bytes)
+        latency = round((time.perf_counter() - start) * 1000)
+        return looks_alive(url, response.status, data), latency, response.status
+
+
+# 请求地址并只读取开头的几个字节，返回 (是否可用, 首字节延迟毫秒, 状态)
+async def check_url(session, url, timeout, first_bytes=FIRST_BYTES):
+    try:
+        return await asyncio.wait_for(read_head(session, url, first_bytes), timeout)
+    except asyncio.TimeoutError:
+        return False, None, 'timeout'
+    except (aiohttp.ClientError, OSError, ValueError) as e:
+        return False, None, type(e).__name__
+
+
+class BulkChecker:
+    """限制总并发和每个主机并发的批量检查器
+
+    待检查的地址按主机排队，固定数量（concurrency）的工作协程轮流从还有空闲名额的主机取下一条，
+    列表中连续大段属于同一主机时，该主机最多占用 per_host 个并发，其余并发继续检查其他主机。
+    排队的只是地址字符串，总数超过 pending_limit 时 submit() 等待，内存不会随列表无限增长。
+    """
+
+    def __init__(self, session, cache, concurrency=CONCURRENCY, per_host=PER_HOST, timeout=TIMEOUT,
+                 pending_limit=PENDING_LIMIT):
+        self.session = session
+        self.cache = cache
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.pending_limit = pending_limit
+        # 主机 -> 待检查的 (键, 地址)，主机 -> 正在检查的条数
+        self.queues = {}
+        self.active = {}
+        # 有待检查地址且未占满名额的主机，按轮转顺序排列
+        self.ready = deque()
+        self.scheduled = set()
+        self.pending = 0
+        self.closed = False
+        lock = asyncio.Lock()
+        self.work = asyncio.Condition(lock)
+        self.space = asyncio.Condition(lock)
+        self.workers = []
+        self.stats = {'checked': 0, 'alive': 0, 'dead': 0, 'cached': 0, 'skipped': 0, 'invalid': 0}
+
+    def schedule(self, host):
+        """主机还有待检查的地址且有空闲名额时排到轮转队尾，返回是否新排入"""
+        if host in self.scheduled or not self.queues.get(host) or self.active.get(host, 0) >= self.per_host:
+            return False
+        self.ready.append(host)
+        self.scheduled.add(host)
+        return True
+
+    async def take(self):
+        """取下一条要检查的地址，全部检查完时返回 None"""
+        async with self.work:
+            await self.work.wait_for(lambda: self.ready or (self.closed and not self.pending))
+            if not self.ready:
+                return None
+            host = self.ready.popleft()
+            self.scheduled.discard(host)
+            queue = self.queues[host]
+            key, url = queue.popleft()
+            if not queue:
+                del self.queues[host]
+            self.pending -= 1
+            self.active[host] = self.active.get(host, 0) + 1
+            self.schedule(host)
+            self.space.notify()
+            if self.closed and not self.pending:
+                self.work.notify_all()
+            return host, key, url
+
+    async def done(self, host):
+        async with self.work:
+            self.active[host] -= 1
+            if not self.active[host]:
+                del self.active[host]
+            if self.schedule(host):
+                self.work.notify()
+
+    async def worker(self):
+        while True:
+            item = await self.take()
+            if item is None:
+                return
+            host, key, url = item
+            try:
+                alive, latency, status = await check_url(self.session, url, self.timeout)
+                self.cache.put(key, alive, latency, status)
+                self.stats['checked'] += 1
+                self.stats['alive' if alive else 'dead'] += 1
+                if self.stats['checked'] % 1000 == 0:
+                    print(f"已检查 {self.stats['checked']} 条，可用 {self.stats['alive']} 条")
+            finally:
+                await self.done(host)
+
+    async def submit(self, url):
+        if not url.startswith(CHECK_SCHEMES):
+            self.stats['skipped'] += 1
+            return
+        key = normalize_url(url)
+        if self.cache.fresh(key):
+            self.stats['cached'] += 1
+            return
+        try:
+            host = urlsplit(url).netloc.lower()
+        except ValueError:
+            # 社区收集的列表里偶尔有格式错误的地址（例如 http://[::1/x），只计数不检查
+            self.stats['invalid'] += 1
+            return
+        if not self.workers:
+            self.workers = [asyncio.ensure_future(self.worker()) for _ in range(self.concurrency)]
+        async with self.space:
+            await self.space.wait_for(lambda: self.pending < self.pending_limit)
+            self.queues.setdefault(host, deque()).append((key, url))
+            self.pending += 1
+            if self.schedule(host):
+                self.work.notify()
+
+    async def join(self):
+        async with self.work:
+            self.closed = True
+            self.work.notify_all()
+        await asyncio.gather(*self.workers)
+
+
+# 逐条读取列表并检查去重后的地址
+async def check_lists(paths, cache, concurrency, per_host, timeout):
+    stats = ClientStats()
+    # 直播源大多是自签名或过期证书，这里只关心能否出流，不校验证书
+    async with make_async_session(limit=concurrency, per_host=per_host, connect_timeout=timeout,
+                                  timeout=timeout * 2, stats=stats, verify_ssl=False) as session:
+        checker = BulkChecker(session, cache, concurrency, per_host, timeout)
+        # 所有文件共用一个去重索引
+        index = UrlIndex()
+        for path in paths:
+            for channel in dedup(read_any(path), index):
+                await checker.submit(channel.url)
+        await checker.join()
+    print(stats.summary())
+    perf.section('http', stats.as_dict())
+    return checker.stats
+
+
+# 把可用（以及未检查协议）的频道按分组写出
+def write_alive(paths, cache, output_path):
+    def alive_channels():
+        for path in paths:
+            for channel in read_any(path):
+                if not channel.url.startswith(CHECK_SCHEMES):
+                    yield channel
+                    continue
+                entry = cache.entries.get(normalize_url(channel.url))
+                if entry and entry['alive']:
+                    yield channel
+
+    with open(output_path, 'w', encoding='utf-8') as out:
+        return writer_for(output_path)(grouped(dedup(alive_channels())), out)
+
+
+# 命令行参数
+def parse_args():
+    parser = argparse.ArgumentParser(description="批量检查 IPTV 列表中的地址是否可用")
+    parser.add_argument('files', nargs='*', default=DEFAULT_FILES,
+                        help="要检查的 TXT / M3U 列表，默认检查 data/test 下的全部列表")
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY,
+                        help="同时进行的检查数")
+    parser.add_argument('--per-host', type=int, default=PER_HOST,
+                        help="每个主机同时进行的检查数")
+    parser.add_argument('--timeout', type=float, default=TIMEOUT,
+                        help="单条地址的超时时间（秒）")
+    parser.add_argument('--cache', default=CACHE_PATH,
+                        help="检查结果缓存文件")
+    parser.add_argument('--ttl', type=float, default=CACHE_TTL_HOURS,
+                        help="检查结果的有效期（小时），过期后重新检查")
+    parser.add_argument('--output', default=None,
+                        help="把可用的频道按分组写入该文件（.txt 或 .m3u）")
+    return parser.parse_args()
+
+
+# 主函数
+def main():
+    args = parse_args()
+    perf.start('iptv_check')
+    files = [path for path in args.files if os.path.exists(path)]
+    cache = CheckCache(args.cache, args.ttl * 3600)
+
+    start = time.perf_counter()
+    try:
+        with perf.stage('check'):
+            stats = asyncio.run(check_lists(files, cache, args.concurrency, args.per_host, args.timeout))
+    finally:
+        # 中途中断时已完成的结果也保存下来
+        cache.save()
+    elapsed = time.perf_counter() - start
+    print(f"检查 {stats['checked']} 条（可用 {stats['alive']}，失效 {stats['dead']}），"
+          f"缓存命中 {stats['cached']} 条，跳过非 HTTP 地址 {stats['skipped']} 条，"
+          f"格式错误 {stats['invalid']} 条，用时 {elapsed:.1f} 秒")
+
+    for key, value in stats.items():
+        perf.count(key, value)
+
+    if args.output:
+        with perf.stage('write'):
+            written = write_alive(files, cache, args.output)
+        print(f"已写入 {written} 个可用频道: {args.output}")
+    perf.finish()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import re
+import time
+import hashlib
+import argparse
+import tempfile
+from array import array
+from collections import namedtuple
+
+# 一个频道：名称、地址、分组和 #EXTINF 中的其他属性（原样保留的文本）
+Channel = namedtuple("Channel", ["name", "url", "group", "attrs"])
+
+# 没有分组信息时使用的分组名
+DEFAULT_GROUP = "未分组"
+
+ATTR_RE = re.compile(r'([\w-]+)="([^"]*)"')
+URL_SCHEMES = ("http://", "https://", "rtmp://", "rtsp://", "rtp://", "udp://", "p3p://", "mitv://")
+DEFAULT_PORTS = {"http": "80", "https": "443"}
+URL_RE = re.compile(r"([A-Za-z][A-Za-z0-9+.-]*)://([^@/?]*@)?(\[[^\]]*\]|[^:/?]*)(?::(\d+))?(.*)$")
+
+# 临时文件中记录的字段分隔符（不会出现在列表文本中的控制字符）
+SEPARATOR = "\x1f"
+
+
+def open_list(path):
+    """以 UTF-8 打开列表文件，兼容 BOM 和 CRLF"""
+    return open(path, "r", encoding="utf-8-sig", errors="replace", newline=None)
+
+
+def read_txt(lines):
+    """逐行解析 '名称,地址' 格式，'分组,#genre#' 行切换当前分组；一行中用 # 分隔的多个地址拆成多条"""
+    group = DEFAULT_GROUP
+    for line in lines:
+        line = line.strip()
+        if not line or "," not in line:
+            continue
+        name, _, value = line.partition(",")
+        value = value.strip()
+        if value == "#genre#":
+            group = name.strip() or DEFAULT_GROUP
+            continue
+        for url in value.split("#"):
+            url = url.strip()
+            if url.startswith(URL_SCHEMES):
+                yield Channel(name.strip(), url, group, "")
+
+
+def split_extinf(line):
+    """拆分 '#EXTINF:-1 属性...,名称'，返回 (属性文本, 名称)；逗号在引号内时不作为分隔符"""
+    body = line[len("#EXTINF:"):]
+    in_quotes = False
+    for index, char in enumerate(body):
+        if char == '"':
+            in_quotes = not in_quotes
+        elif char == "," and not in_quotes:
+            return body[:index], body[index + 1:].strip()
+    return body, ""
+
+
+def read_m3u(lines):
+    """逐行解析 #EXTINF 格式，地址行紧跟在 #EXTINF 之后"""
+    pending = None
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("#EXTINF:"):
+            attr_text, name = split_extinf(line)
+            attrs = dict(ATTR_RE.findall(attr_text))
+            if not name or '="' in name:
+                # 名称部分损坏时退回 tvg-name
+                name = attrs.get("tvg-name", name)
+            duration = attr_text.split(" ", 1)
+            extra = duration[1].strip() if len(duration) > 1 else ""
+            pending = (name, attrs.get("group-title") or DEFAULT_GROUP, extra)
+        elif line.startswith("#"):
+            continue
+        elif pending is not None:
+            name, group, extra = pending
+            yield Channel(name, line, group, extra)
+            pending = None
+
+
+def read_any(path):
+    """按扩展名选择解析器，逐条产出频道"""
+    with open_list(path) as f:
+        reader = read_m3u if path.lower().endswith((".m3u", ".m3u8")) else read_txt
+        yield from reader(f)
+
+
+def normalize_url(url):
+    """规范化地址用于去重：协议和主机小写、去掉默认端口、片段和空查询串
+
+    列表里几万条地址都走这里，用一个正则代替 urlsplit/urlunsplit。
+    """
+    url = url.strip().split("#", 1)[0].rstrip("?")
+    match = URL_RE.match(url)
+    if match is None:
+        return url
+    scheme, userinfo, host, port, rest = match.groups()
+    scheme = scheme.lower()
+    if port and DEFAULT_PORTS.get(scheme) == port:
+        port = None
+    netloc = f"{userinfo or ''}{host.lower()}{':' + port if port else ''}"
+    return f"{scheme}://{netloc}{rest or '/'}"
+
+
+def url_key(url):
+    """规范化地址的 64 位哈希，作为去重索引中的紧凑键"""
+    return int.from_bytes(hashlib.blake2b(normalize_url(url).encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class UrlIndex:
+    """只保存 64 位整数哈希的去重索引"""
+
+    def __init__(self):
+        self.keys = set()
+
+    def add(self, url):
+        """地址第一次出现时返回 True"""
+        key = url_key(url)
+        if key in self.keys:
+            return False
+        self.keys.add(key)
+        return True
+
+    def __len__(self):
+        return len(self.keys)
+
+
+def write_txt(channels, out):
+    """写出 TXT 格式，分组变化时插入 '分组,#genre#' 行"""
+    group = None
+    count = 0
+    for channel in channels:
+        if channel.group != group:
+            if group is not None:
+                out.write("\n")
+            out.write(f"{channel.group},#genre#\n")
+            group = channel.group
+        out.write(f"{channel.name},{channel.url}\n")
+        count += 1
+    return count
+
+
+def write_m3u(channels, out):
+    """写出 M3U 格式，分组写入 group-title 属性"""
+    out.write("#EXTM3U\n")
+    count = 0
+    for channel in channels:
+        attrs = channel.attrs
+        if 'group-title="' not in attrs:
+            attrs = f'{attrs} group-title="{channel.group}"'.strip()
+        out.write(f"#EXTINF:-1 {attrs},{channel.name}\n{channel.url}\n")
+        count += 1
+    return count
+
+
+def writer_for(path):
+    return write_m3u if path.lower().endswith((".m3u", ".m3u8")) else write_txt
+
+
+def dedup(channels, index=None):
+    """按规范化地址去重，保持首次出现的顺序"""
+    index = index if index is not None else UrlIndex()
+    for channel in channels:
+        if index.add(channel.url):
+            yield channel
+
+
+def grouped(channels):
+    """把频道按分组归并（分组按首次出现的顺序），不在内存中保存频道本身
+
+    频道先顺序写入临时文件，每个分组只记录各条记录在文件中的偏移量。
+    """
+    offsets = {}
+    with tempfile.TemporaryFile("w+b") as spool:
+        for channel in channels:
+            offsets.setdefault(channel.group, array("Q")).append(spool.tell())
+            record = SEPARATOR.join((channel.name, channel.url, channel.attrs))
+            spool.write(record.replace("\n", " ").encode("utf-8") + b"\n")
+        for group, positions in offsets.items():
+            for position in positions:
+                spool.seek(position)
+                name, url, attrs = spool.readline().decode("utf-8").rstrip("\n").split(SEPARATOR)
+                yield Channel(name, url, group, attrs)
+
+
+def merge(paths, output_path):
+    """合并多个列表：跨文件去重后按分组写出，返回 (读取条数, 写出条数)"""
+    counter = {"read": 0}
+
+    def all_channels():
+        for path in paths:
+            for channel in read_any(path):
+                counter["read"] += 1
+                yield channel
+
+    with open(output_path, "w", encoding="utf-8") as out:
+        written = writer_for(output_path)(grouped(dedup(all_channels())), out)
+    return counter["read"], written
+
+
+def convert(input_path, output_path):
+    """在两种格式之间转换，保持原有顺序"""
+    with open(output_path, "w", encoding="utf-8") as out:
+        return writer_for(output_path)(read_any(input_path), out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IPTV TXT / M3U 列表的流式转换与合并")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_convert = sub.add_parser("convert", help="转换格式（按输出文件扩展名决定）")
+    p_convert.add_argument("input")
+    p_convert.add_argument("output")
+    p_merge = sub.add_parser("merge", help="跨文件去重并按分组合并")
+    p_merge.add_argument("-o", "--output", required=True)
+    p_merge.add_argument("inputs", nargs="+")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == "convert":
+        written = convert(args.input, args.output)
+        print(f"Converted {written} channels to {args.output}")
+    else:
+        read, written = merge(args.inputs, args.output)
+        print(f"Merged {read} channels from {len(args.inputs)} files into {written} unique channels: {args.output}")
+    print(f"Elapsed {time.perf_counter() - start:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
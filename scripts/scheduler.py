@@ -0,0 +1,376 @@
+# 常驻调度进程：按各工作流的 cron 时间在同一个进程中运行所有入口脚本
+#
+# 脚本只在第一次运行时导入，之后每次直接调用入口函数，省去解释器和依赖的启动时间；
+# 所有任务共用同一个工作目录和 .cache，响应缓存、IPDB 源校验信息和探测历史在两次运行之间一直有效。
+# 任务之间的先后关系直接写在 JOBS 中（例如 port_probe 在 ipdb_merge 之后运行）。
+#
+# 常驻运行（在仓库根目录执行）：
+#     python scripts/scheduler.py
+# 立即运行某些任务及其下游任务后退出：
+#     python scripts/scheduler.py --once ipdb_merge
+# 查看每个任务上一次运行的耗时和结果：
+#     python scripts/scheduler.py --status
+import os
+import sys
+import json
+import time
+import argparse
+import importlib.util
+import subprocess
+import traceback
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPTS_DIR)
+from common.playlist_store import atomic_write
+
+# 每个任务上一次运行的时间、耗时和结果
+STATE_PATH = '.cache/scheduler.json'
+
+# 空闲时最长休眠时间（秒），系统时间被调整后最多晚这么久发现
+MAX_SLEEP = 60
+
+# cron 各字段的取值范围：分、时、日、月、星期（0 为星期日，7 也当作星期日）
+CRON_FIELDS = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+# cron 表达式最多向后查找的年数，超过仍未匹配（例如 2 月 30 日）视为表达式错误
+CRON_SEARCH_YEARS = 5
+
+
+# 解析 cron 的一个字段，支持 *、a-b、*/n、a-b/n 和逗号分隔的列表
+def parse_cron_field(text, low, high):
+    values = set()
+    for part in text.split(','):
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            step = int(step_text)
+            if step < 1:
+                raise ValueError(f"cron 步长必须大于 0: {text}")
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = (int(value) for value in part.split('-', 1))
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if not low <= start <= end <= high:
+            raise ValueError(f"cron 字段超出范围 {low}-{high}: {text}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """标准五字段 cron 表达式（UTC，与 GitHub Actions 的 schedule 相同）
+
+    日和星期都不是 * 时，两者满足其一即可，与 cron 的规则一致。
+    """
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"cron 表达式应为 5 个字段: {expression}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            parse_cron_field(text, low, high) for text, (low, high) in zip(fields, CRON_FIELDS))
+        self.weekdays = {day % 7 for day in weekdays}
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    def _day_matches(self, moment):
+        day = moment.day in self.days
+        # datetime 的星期一为 0，cron 的星期日为 0
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, moment):
+        """严格晚于 moment 的下一个匹配时刻"""
+        moment = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment.year + CRON_SEARCH_YEARS
+        while moment.year <= limit:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f"cron 表达式永远不会匹配: {self.expression}")
+
+
+class Job:
+    """一个入口脚本
+
+    script 为相对 scripts/ 的路径，entry 为入口函数名，args 作为该脚本的命令行参数。
+    cron 为 None 时只在 after 中的任务结束后运行；两者都设置时两种情况都会运行。
+    上游任务失败时下游任务照常运行（与 workflow_run 的 completed 相同）。
+    outputs 和 message 为 --git 模式下提交的文件和提交信息，与原工作流一致。
+    """
+
+    def __init__(self, name, script, cron=None, after=(), entry='main', args=(), outputs=(), message=None):
+        self.name = name
+        self.script = script
+        self.schedule = CronSchedule(cron) if cron else None
+        self.after = list(after)
+        self.entry = entry
+        self.args = list(args)
+        self.outputs = list(outputs)
+        self.message = message or f"Update {name} output"
+        self.module = None
+
+    def load(self):
+        """第一次运行时导入脚本，之后复用同一个模块"""
+        if self.module is None:
+            path = os.path.join(SCRIPTS_DIR, self.script)
+            # 脚本可能导入同目录下的模块（例如 ccc/kxwl_nodes.py）
+            folder = os.path.dirname(path)
+            if folder not in sys.path:
+                sys.path.insert(0, folder)
+            module_name = f"job_{self.name}"
+            spec = importlib.util.spec_from_file_location(module_name, path)
+            module = importlib.util.module_from_spec(spec)
+            # 先登记再执行，多进程解析时子进程能按模块名找到函数
+            sys.modules[module_name] = module
+            try:
+                spec.loader.exec_module(module)
+            except BaseException:
+                del sys.modules[module_name]
+                raise
+            self.module = module
+        return getattr(self.module, self.entry)
+
+
+# 与 .github/workflows 中各工作流对应的任务
+JOBS = [
+    Job('ipdb_merge', 'bbb/add_port_script.py', cron='0 * * * *',
+        outputs=['scripts/bbb/port.txt'], message="Update IP list with port 443"),
+    # 每天从 Cloudflare 和 Oracle 的官方列表刷新离线 IP 段数据，供 port_probe 按归属预过滤
+    Job('ip_ranges', 'common/ip_index.py', cron='0 0 * * *', args=['update'],
+        outputs=['scripts/common/data/ip_ranges.txt'], message="Update IP range data"),
+    Job('port_probe', 'bbb/generate_port_txt.py', after=['ipdb_merge'],
+        outputs=['scripts/bbb/port.txt', 'scripts/bbb/ip.txt'], message="Update accessible IPs in port.txt"),
+    Job('cf_table', 'bbb/fetch_table_data.py', cron='0 */3 * * *',
+        outputs=['scripts/bbb/port_data.txt'], message="Update IP list with port and tag"),
+    Job('ddd_nodes', 'ddd/test.py', cron='0 */8 * * *',
+        outputs=['scripts/ddd/hao.txt', 'scripts/ddd/hao_base64.txt', 'scripts/ddd/hao_clash.yaml',
+                 'scripts/ddd/digests.json'],
+        message="Update IP list with port and tag"),
+    # 电视剧（20）和综艺（27）在同一个进程中由 crawl.py 抓取，共用连接池、缓存和限速；
+    # 综艺打包输出，构建完成后一次切换，读者不会看到清空中的目录
+    Job('huyazy_all', 'crawl.py', cron='0 16 * * *', args=['--packed'],
+        outputs=['scripts/aaa'], message="Update M3U files"),
+    Job('kxwl_sync', 'ccc/update_ccc.py', cron='0 0,8,16 * * *', entry='fetch_and_save_recent_files',
+        outputs=['scripts/ccc'], message="Update kxwl files with recent content"),
+]
+
+
+def utc_now():
+    return datetime.now(timezone.utc)
+
+
+def format_time(moment):
+    return moment.strftime('%Y-%m-%dT%H:%M:%SZ') if moment else None
+
+
+def load_state(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(path, state):
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    atomic_write(path, json.dumps(state, ensure_ascii=False, indent=2, sort_keys=True).encode('utf-8'))
+
+
+# 在当前进程中运行一个任务，返回 (是否成功, 错误信息)
+def run_job(job):
+    saved_argv = sys.argv
+    sys.argv = [os.path.join(SCRIPTS_DIR, job.script)] + job.args
+    try:
+        job.load()()
+        return True, None
+    except SystemExit as e:
+        if e.code in (None, 0):
+            return True, None
+        return False, f"退出码 {e.code}"
+    except Exception as e:
+        traceback.print_exc()
+        return False, f"{type(e).__name__}: {e}"
+    finally:
+        sys.argv = saved_argv
+
+
+# 提交并推送任务的输出文件，没有变化时跳过
+def commit_outputs(job):
+    if not job.outputs:
+        return
+    subprocess.run(['git', 'add', '-A', '--'] + job.outputs, check=False)
+    if subprocess.run(['git', 'diff', '--cached', '--quiet', '--'] + job.outputs).returncode == 0:
+        print(f"[{job.name}] 输出没有变化，不提交")
+        return
+    if subprocess.run(['git', 'commit', '-q', '-m', job.message, '--'] + job.outputs).returncode != 0:
+        print(f"[{job.name}] 提交失败")
+        return
+    if subprocess.run(['git', 'push', '-q'], check=False).returncode != 0:
+        print(f"[{job.name}] 推送失败，下次提交时一起推送")
+
+
+class Scheduler:
+    """按 cron 时间和依赖关系依次运行任务
+
+    任务共用 sys.argv 和性能记录器，因此同一时刻只运行一个任务；
+    运行期间错过的 cron 时刻不补跑，只在结束后排到下一个时刻。
+    """
+
+    def __init__(self, jobs, state_path=STATE_PATH, commit=False):
+        self.jobs = {job.name: job for job in jobs}
+        for job in jobs:
+            for upstream in job.after:
+                if upstream not in self.jobs:
+                    raise ValueError(f"任务 {job.name} 依赖的任务不存在: {upstream}")
+        self.state_path = state_path
+        self.state = load_state(state_path)
+        self.commit = commit
+        self.queue = deque()
+        self.next_run = {}
+
+    def dependents(self, name):
+        return [job.name for job in self.jobs.values() if name in job.after]
+
+    def enqueue(self, name):
+        if name not in self.queue:
+            self.queue.append(name)
+
+    def run(self, name):
+        job = self.jobs[name]
+        print(f"[{name}] 开始运行 {job.script}")
+        started = utc_now()
+        start = time.perf_counter()
+        ok, error = run_job(job)
+        duration = time.perf_counter() - start
+        if ok and self.commit:
+            commit_outputs(job)
+
+        entry = self.state.setdefault(name, {'runs': 0, 'failures': 0})
+        entry['runs'] += 1
+        entry['failures'] += 0 if ok else 1
+        entry['last_started'] = format_time(started)
+        entry['last_duration'] = round(duration, 3)
+        entry['last_status'] = 'ok' if ok else 'failed'
+        entry['last_error'] = error
+        if ok:
+            entry['last_success'] = format_time(started)
+        print(f"[{name}] {'完成' if ok else '失败'}，耗时 {duration:.2f} 秒" + (f"（{error}）" if error else ''))
+
+        for dependent in self.dependents(name):
+            self.enqueue(dependent)
+        self.save()
+        return ok
+
+    def save(self):
+        for name, moment in self.next_run.items():
+            self.state.setdefault(name, {'runs': 0, 'failures': 0})['next_run'] = format_time(moment)
+        save_state(self.state_path, self.state)
+
+    def drain(self):
+        """运行队列中的任务及其下游任务，返回失败的任务数"""
+        failures = 0
+        while self.queue:
+            failures += not self.run(self.queue.popleft())
+        return failures
+
+    def run_forever(self, run_now=False):
+        now = utc_now()
+        for job in self.jobs.values():
+            if job.schedule is not None:
+                self.next_run[job.name] = now if run_now else job.schedule.next_after(now)
+        if not self.next_run:
+            raise ValueError("没有设置 cron 的任务")
+        self.save()
+        print("已调度: " + '，'.join(f"{name} {format_time(moment)}" for name, moment in self.next_run.items()))
+
+        while True:
+            self.drain()
+            name, moment = min(self.next_run.items(), key=lambda item: item[1])
+            wait = (moment - utc_now()).total_seconds()
+            if wait > 0:
+                time.sleep(min(wait, MAX_SLEEP))
+                continue
+            # 从现在开始计算下一次，长任务期间错过的时刻不补跑
+            self.next_run[name] = self.jobs[name].schedule.next_after(max(moment, utc_now()))
+            self.enqueue(name)
+
+
+def print_status(jobs, state):
+    print(f"{'任务':<16}{'上次开始':<22}{'耗时(秒)':>10}  {'结果':<8}{'次数/失败':>10}  下次运行")
+    for job in jobs:
+        entry = state.get(job.name, {})
+        duration = entry.get('last_duration')
+        print(f"{job.name:<16}{entry.get('last_started') or '-':<22}"
+              f"{'-' if duration is None else f'{duration:.2f}':>10}  {entry.get('last_status') or '-':<8}"
+              f"{entry.get('runs', 0):>5}/{entry.get('failures', 0):<4}  "
+              f"{entry.get('next_run') or ('在 ' + '、'.join(job.after) + ' 之后' if job.after else '-')}")
+        if entry.get('last_error'):
+            print(f"    {entry['last_error']}")
+
+
+# 命令行参数
+def parse_args():
+    parser = argparse.ArgumentParser(description="在一个常驻进程中按 cron 时间运行所有抓取和更新脚本")
+    parser.add_argument('--only', nargs='+', default=None,
+                        help="只调度这些任务，默认全部")
+    parser.add_argument('--once', nargs='+', default=None,
+                        help="立即运行这些任务及其下游任务，然后退出")
+    parser.add_argument('--run-now', action='store_true',
+                        help="启动时先把所有 cron 任务运行一次")
+    parser.add_argument('--git', action='store_true',
+                        help="任务成功后提交并推送其输出文件，与原工作流相同")
+    parser.add_argument('--state', default=STATE_PATH,
+                        help="记录各任务运行时间和结果的文件")
+    parser.add_argument('--status', action='store_true',
+                        help="显示各任务上一次运行的耗时和结果后退出")
+    return parser.parse_args()
+
+# 主函数
+def main():
+    args = parse_args()
+    # 各脚本使用相对仓库根目录的路径
+    os.chdir(os.path.dirname(SCRIPTS_DIR))
+
+    jobs = [job for job in JOBS if not args.only or job.name in args.only]
+    selected = {job.name for job in jobs}
+    unknown = [name for name in (args.only or []) + (args.once or []) if name not in selected]
+    if unknown:
+        sys.exit(f"没有这些任务: {' '.join(unknown)}（可选: {' '.join(sorted(selected))}）")
+    # 只调度部分任务时忽略不在其中的上游任务
+    for job in jobs:
+        job.after = [name for name in job.after if name in selected]
+
+    if args.status:
+        print_status(jobs, load_state(args.state))
+        return
+
+    scheduler = Scheduler(jobs, args.state, commit=args.git)
+    if args.once:
+        for name in args.once:
+            scheduler.enqueue(name)
+        sys.exit(1 if scheduler.drain() else 0)
+    try:
+        scheduler.run_forever(args.run_now)
+    except KeyboardInterrupt:
+        print("已停止")
+        scheduler.save()
+
+if __name__ == "__main__":
+    main()